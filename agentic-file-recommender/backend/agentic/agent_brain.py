@@ -1,8 +1,60 @@
 import logging
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
 from .schemas import IntentType, ToolCall, ToolName
 import re
 
+# Keyword heuristics per intent, checked in priority order (first match wins)
+_INTENT_KEYWORDS = (
+    (IntentType.SCAN_DIRECTORY, ("scan", "index", "search directory"),
+     "User wants to scan and index files"),
+    (IntentType.FIND_RELATED, ("related", "similar", "find files"),
+     "User wants to find files related to a specific file"),
+    (IntentType.GET_RECENT, ("recent", "last week", "yesterday", "new files"),
+     "User wants to see recently accessed or modified files"),
+    (IntentType.ANALYZE_WORKFLOW, ("workflow", "together", "co-occurrence", "pattern"),
+     "User wants to analyze workflow and file patterns"),
+    (IntentType.FILTER_FILES, ("filter", "find", "search"),
+     "User wants to filter or search files"),
+)
+
+# All keywords fused into one case-insensitive lookahead pattern, so
+# overlapping keywords are still seen; the named group that matched gives
+# the rank of its intent in _INTENT_KEYWORDS
+_INTENT_RE = re.compile(
+    "(?=" + "|".join(
+        f"(?P<i{rank}>{'|'.join(re.escape(kw) for kw in keywords)})"
+        for rank, (_, keywords, _) in enumerate(_INTENT_KEYWORDS)
+    ) + ")",
+    re.IGNORECASE,
+)
+
+# Parameterless plans are identical on every call, so build the (frozen)
+# ToolCalls once and hand out copies of these tuples
+_PLAN_LIST_FOR_RELATED = (ToolCall(
+    tool=ToolName.GET_FILES,
+    reasoning="Getting available files to find related ones"
+),)
+_PLAN_GET_RECENT = (ToolCall(
+    tool=ToolName.GET_FILES,
+    reasoning="Getting recently accessed files from database"
+),)
+_PLAN_ANALYZE_WORKFLOW = (ToolCall(
+    tool=ToolName.ANALYZE_ACTIVITY,
+    reasoning="Analyzing workflow patterns and co-occurrence"
+),)
+_PLAN_FILTER_FILES = (ToolCall(
+    tool=ToolName.GET_FILES,
+    reasoning="Getting files to apply filtering"
+),)
+_PLAN_DEFAULT = (ToolCall(
+    tool=ToolName.GET_FILES,
+    reasoning="Unknown intent, retrieving available files"
+),)
+
+# Quoted string (group 1) or a token starting with . or / (group 2)
+_PATH_COMBINED_RE = re.compile(r'"([^"]*)"|([\./]\S+)')
+
 class AgentBrain:
     """LLM-based reasoning layer for intent parsing and planning."""
     
@@ -10,29 +62,53 @@ class AgentBrain:
         self.config = config
         self.llm_model = config.get("agentic", {}).get("llm_model", "llama2")
         self.use_local_llm = config.get("agentic", {}).get("use_local_llm", True)
-        
+        # Per-instance LRU of full plans keyed on the normalized query
+        cache_size = config.get("agentic", {}).get("plan_cache_size", 512)
+        self.plan_for = lru_cache(maxsize=cache_size)(self._plan_for)
+        # Per-intent handlers, dispatched by dict lookup instead of if/elif chains
+        self._planners: Dict[IntentType, Callable[[str], List[ToolCall]]] = {
+            IntentType.SCAN_DIRECTORY: self._plan_scan,
+            IntentType.FIND_RELATED: self._plan_find_related,
+            IntentType.GET_RECENT: self._plan_get_recent,
+            IntentType.ANALYZE_WORKFLOW: self._plan_analyze_workflow,
+            IntentType.FILTER_FILES: self._plan_filter_files,
+        }
+        self._evaluators: Dict[IntentType, Callable[[Dict], Optional[Tuple[float, str]]]] = {
+            IntentType.SCAN_DIRECTORY: self._evaluate_scan,
+            IntentType.FIND_RELATED: self._evaluate_find_related,
+            IntentType.GET_RECENT: self._evaluate_get_recent,
+            IntentType.ANALYZE_WORKFLOW: self._evaluate_analyze_workflow,
+        }
+        self._next_steps: Dict[IntentType, Callable[[Dict], str]] = {
+            IntentType.SCAN_DIRECTORY: self._next_steps_scan,
+            IntentType.FIND_RELATED: self._next_steps_find_related,
+            IntentType.GET_RECENT: self._next_steps_get_recent,
+            IntentType.ANALYZE_WORKFLOW: self._next_steps_analyze_workflow,
+        }
+        
+    def _plan_for(self, query: str) -> Tuple[IntentType, str, Tuple[ToolCall, ...]]:
+        """Parse intent and plan tools for a normalized query (cached via plan_for)."""
+        intent, reasoning = self.parse_intent(query)
+        return intent, reasoning, tuple(self.plan_tools(intent, query))
+    
     def parse_intent(self, query: str) -> Tuple[IntentType, str]:
         """
         Parse user intent from natural language query.
         Uses heuristic-based parsing (lightweight, no external LLM required).
         """
-        query_lower = query.lower()
-        
-        # Intent matching heuristics
-        if any(keyword in query_lower for keyword in ["scan", "index", "search directory"]):
-            return IntentType.SCAN_DIRECTORY, "User wants to scan and index files"
-        
-        if any(keyword in query_lower for keyword in ["related", "similar", "find files"]):
-            return IntentType.FIND_RELATED, "User wants to find files related to a specific file"
-        
-        if any(keyword in query_lower for keyword in ["recent", "last week", "yesterday", "new files"]):
-            return IntentType.GET_RECENT, "User wants to see recently accessed or modified files"
-        
-        if any(keyword in query_lower for keyword in ["workflow", "together", "co-occurrence", "pattern"]):
-            return IntentType.ANALYZE_WORKFLOW, "User wants to analyze workflow and file patterns"
-        
-        if any(keyword in query_lower for keyword in ["filter", "find", "search"]):
-            return IntentType.FILTER_FILES, "User wants to filter or search files"
+        # Intent matching heuristics: single pass over the query, keeping the
+        # highest-priority intent seen
+        best = len(_INTENT_KEYWORDS)
+        for match in _INTENT_RE.finditer(query):
+            rank = int(match.lastgroup[1:])
+            if rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        
+        if best < len(_INTENT_KEYWORDS):
+            intent, _, reasoning = _INTENT_KEYWORDS[best]
+            return intent, reasoning
         
         return IntentType.UNKNOWN, "Could not determine intent"
     
@@ -40,88 +116,57 @@ class AgentBrain:
         """
         Generate a plan of tools to execute based on intent.
         """
-        tools = []
-        reasoning = "Tool selection based on intent analysis"
-        
-        if intent == IntentType.SCAN_DIRECTORY:
-            # Extract path from query
-            path = self._extract_path(query) or "."
-            tools.append(ToolCall(
-                tool=ToolName.SCAN,
-                parameters={"path": path},
-                reasoning="Scanning directory to index files"
-            ))
-        
-        elif intent == IntentType.FIND_RELATED:
-            # Extract file path from query
-            file_path = self._extract_file_path(query)
-            if file_path:
-                tools.append(ToolCall(
-                    tool=ToolName.RECOMMEND,
-                    parameters={"file_path": file_path, "limit": 5},
-                    reasoning="Finding files related to the specified file"
-                ))
-            else:
-                # First get files list, then show options
-                tools.append(ToolCall(
-                    tool=ToolName.GET_FILES,
-                    parameters={},
-                    reasoning="Getting available files to find related ones"
-                ))
-        
-        elif intent == IntentType.GET_RECENT:
-            # First get files, could be enhanced with filtering
-            tools.append(ToolCall(
-                tool=ToolName.GET_FILES,
-                parameters={},
-                reasoning="Getting recently accessed files from database"
-            ))
-        
-        elif intent == IntentType.ANALYZE_WORKFLOW:
-            tools.append(ToolCall(
-                tool=ToolName.ANALYZE_ACTIVITY,
-                parameters={},
-                reasoning="Analyzing workflow patterns and co-occurrence"
-            ))
-        
-        elif intent == IntentType.FILTER_FILES:
-            tools.append(ToolCall(
-                tool=ToolName.GET_FILES,
-                parameters={},
-                reasoning="Getting files to apply filtering"
-            ))
-        
-        else:
-            # Default: get files
-            tools.append(ToolCall(
-                tool=ToolName.GET_FILES,
-                parameters={},
-                reasoning="Unknown intent, retrieving available files"
-            ))
-        
-        return tools
+        return self._planners.get(intent, self._plan_default)(query)
+    
+    def _plan_scan(self, query: str) -> List[ToolCall]:
+        # Extract path from query
+        path = self._extract_path(query) or "."
+        return [ToolCall(
+            tool=ToolName.SCAN,
+            parameters={"path": path},
+            reasoning="Scanning directory to index files"
+        )]
+    
+    def _plan_find_related(self, query: str) -> List[ToolCall]:
+        # Extract file path from query
+        file_path = self._extract_file_path(query)
+        if file_path:
+            return [ToolCall(
+                tool=ToolName.RECOMMEND,
+                parameters={"file_path": file_path, "limit": 5},
+                reasoning="Finding files related to the specified file"
+            )]
+        # First get files list, then show options
+        return list(_PLAN_LIST_FOR_RELATED)
+    
+    def _plan_get_recent(self, query: str) -> List[ToolCall]:
+        # First get files, could be enhanced with filtering
+        return list(_PLAN_GET_RECENT)
+    
+    def _plan_analyze_workflow(self, query: str) -> List[ToolCall]:
+        return list(_PLAN_ANALYZE_WORKFLOW)
+    
+    def _plan_filter_files(self, query: str) -> List[ToolCall]:
+        return list(_PLAN_FILTER_FILES)
+    
+    def _plan_default(self, query: str) -> List[ToolCall]:
+        # Default: get files
+        return list(_PLAN_DEFAULT)
     
     def _extract_path(self, query: str) -> str:
         """Extract file path from query."""
-        # Simple heuristic: look for quoted strings or common path patterns
-        import re
-        
-        # Look for quoted paths
-        quoted = re.findall(r'"([^"]*)"', query)
-        if quoted:
-            return quoted[0]
-        
-        # Look for paths starting with ./ or /
-        paths = re.findall(r'[\./][^\s]+', query)
-        if paths:
-            return paths[0]
-        
-        return None
+        # Simple heuristic: quoted strings win over bare path-like tokens
+        # (./foo, /foo); both are found in a single scan of the query
+        fallback = None
+        for match in _PATH_COMBINED_RE.finditer(query):
+            if match.group(1) is not None:
+                return match.group(1)
+            if fallback is None:
+                fallback = match.group(2)
+        return fallback
     
-    def _extract_file_path(self, query: str) -> str:
-        """Extract file path for recommendation from query."""
-        # Similar to _extract_path
-        return self._extract_path(query)
+    # Recommendation targets use the same heuristic
+    _extract_file_path = _extract_path
     
     def evaluate_results(self, results: Dict, intent: IntentType) -> Tuple[float, str]:
         """
@@ -138,52 +183,55 @@ class AgentBrain:
             return 0.4, "Tool execution was not successful"
         
         # Calculate confidence based on result quality
-        if intent == IntentType.SCAN_DIRECTORY:
-            if results.get("message"):
-                return 0.95, "Successfully scanned directory"
-        
-        elif intent == IntentType.FIND_RELATED:
-            recs = results.get("recommendations", [])
-            if len(recs) > 0:
-                return 0.9, f"Found {len(recs)} related files"
-            else:
-                return 0.6, "No related files found"
-        
-        elif intent == IntentType.GET_RECENT:
-            files = results.get("files", [])
-            if len(files) > 0:
-                return 0.85, f"Retrieved {len(files)} files"
-            else:
-                return 0.5, "No files in database"
-        
-        elif intent == IntentType.ANALYZE_WORKFLOW:
-            if results.get("most_accessed_files") or results.get("top_cooccurrence_pairs"):
-                return 0.9, "Successfully analyzed workflow patterns"
-            else:
-                return 0.6, "Limited activity data available"
-        
-        return 0.7, "Results retrieved successfully"
+        evaluator = self._evaluators.get(intent)
+        evaluation = evaluator(results) if evaluator else None
+        return evaluation or (0.7, "Results retrieved successfully")
+    
+    def _evaluate_scan(self, results: Dict) -> Optional[Tuple[float, str]]:
+        if results.get("message"):
+            return 0.95, "Successfully scanned directory"
+        return None
+    
+    def _evaluate_find_related(self, results: Dict) -> Optional[Tuple[float, str]]:
+        recs = results.get("recommendations", [])
+        if len(recs) > 0:
+            return 0.9, f"Found {len(recs)} related files"
+        return 0.6, "No related files found"
+    
+    def _evaluate_get_recent(self, results: Dict) -> Optional[Tuple[float, str]]:
+        files = results.get("files", [])
+        if len(files) > 0:
+            return 0.85, f"Retrieved {len(files)} files"
+        return 0.5, "No files in database"
+    
+    def _evaluate_analyze_workflow(self, results: Dict) -> Optional[Tuple[float, str]]:
+        if results.get("most_accessed_files") or results.get("top_cooccurrence_pairs"):
+            return 0.9, "Successfully analyzed workflow patterns"
+        return 0.6, "Limited activity data available"
     
     def generate_next_steps(self, intent: IntentType, results: Dict, confidence: float) -> str:
         """Generate suggestions for next steps based on results."""
         if confidence < 0.5:
             return "Please provide more specific information or check the system status"
         
-        if intent == IntentType.SCAN_DIRECTORY:
-            return "You can now get recommendations for any scanned file"
-        
-        elif intent == IntentType.FIND_RELATED:
-            recs_count = len(results.get("recommendations", []))
-            if recs_count > 0:
-                return f"Review the {recs_count} related files, or refine your search criteria"
-            else:
-                return "Try scanning more files or searching for different content"
-        
-        elif intent == IntentType.GET_RECENT:
-            files_count = len(results.get("files", []))
-            return f"You can log activity on any of these {files_count} files to build workflow patterns"
-        
-        elif intent == IntentType.ANALYZE_WORKFLOW:
-            return "Based on workflow analysis, you can optimize your file organization"
+        handler = self._next_steps.get(intent)
+        if handler:
+            return handler(results)
         
         return "Explore other queries or refine your current search"
+    
+    def _next_steps_scan(self, results: Dict) -> str:
+        return "You can now get recommendations for any scanned file"
+    
+    def _next_steps_find_related(self, results: Dict) -> str:
+        recs_count = len(results.get("recommendations", []))
+        if recs_count > 0:
+            return f"Review the {recs_count} related files, or refine your search criteria"
+        return "Try scanning more files or searching for different content"
+    
+    def _next_steps_get_recent(self, results: Dict) -> str:
+        files_count = len(results.get("files", []))
+        return f"You can log activity on any of these {files_count} files to build workflow patterns"
+    
+    def _next_steps_analyze_workflow(self, results: Dict) -> str:
+        return "Based on workflow analysis, you can optimize your file organization"
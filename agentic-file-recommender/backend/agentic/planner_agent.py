@@ -1,6 +1,8 @@
 import logging
+import time
+from collections import OrderedDict
 from typing import Dict, Any
-from .schemas import AgentRequest, AgentResponse, ToolCall
+from .schemas import AgentRequest, AgentResponse, ToolCall, IntentType
 from .tool_registry import ToolRegistry
 from .agent_brain import AgentBrain
 
@@ -13,6 +15,42 @@ class PlannerAgent:
         self.brain = agent_brain
         self.max_steps = config.get("agentic", {}).get("planning_steps", 3)
         self.hitl_enabled = config.get("agentic", {}).get("hitl_enabled", True)
+        self.result_cache_ttl = config.get("agentic", {}).get("result_cache_ttl", 5.0)
+        self.result_cache_size = config.get("agentic", {}).get("result_cache_size", 128)
+        # (tool, parameters) -> (expiry time, result) for read-only tools, in LRU order
+        self._result_cache: OrderedDict = OrderedDict()
+    
+    async def _run_tool(self, tool_call: ToolCall) -> Dict[str, Any]:
+        """Execute a tool, reusing recent results of read-only tools."""
+        if not tool_call.tool.cacheable:
+            # Side-effecting tools may change what read-only tools return
+            self._result_cache.clear()
+            return await self.tool_registry.execute_tool(
+                tool_call.tool.value,
+                **tool_call.parameters
+            )
+        
+        key = (tool_call.tool, tuple(sorted(tool_call.parameters.items())))
+        now = time.monotonic()
+        cached = self._result_cache.get(key)
+        if cached and cached[0] > now:
+            logging.info(f"Using cached result for tool: {tool_call.tool.value}")
+            self._result_cache.move_to_end(key)
+            return cached[1]
+        
+        result = await self.tool_registry.execute_tool(
+            tool_call.tool.value,
+            **tool_call.parameters
+        )
+        if result.get("success"):
+            # Drop expired entries, then the least recently used beyond the bound
+            for stale in [k for k, (expiry, _) in self._result_cache.items() if expiry <= now]:
+                del self._result_cache[stale]
+            self._result_cache[key] = (now + self.result_cache_ttl, result)
+            self._result_cache.move_to_end(key)
+            if len(self._result_cache) > self.result_cache_size:
+                self._result_cache.popitem(last=False)
+        return result
     
     async def execute(self, request: AgentRequest) -> AgentResponse:
         """
@@ -26,13 +64,28 @@ class PlannerAgent:
         5. HITL: Ask for confirmation if needed
         """
         try:
-            # Step 1: REASON - Parse intent
+            # Step 1 & 2: REASON & PLAN - Parse intent and generate tool calls
+            # (repeated queries are served from the brain's plan cache)
             logging.info(f"Processing query: {request.query}")
-            intent, intent_reasoning = self.brain.parse_intent(request.query)
+            intent, intent_reasoning, tool_calls = self.brain.plan_for(request.query.strip())
             logging.info(f"Detected intent: {intent.value}")
             
-            # Step 2: PLAN - Generate tool calls
-            tool_calls = self.brain.plan_tools(intent, request.query)
+            # Nothing useful to run for an unrecognized query; ask the user
+            # to rephrase instead of listing files
+            if intent == IntentType.UNKNOWN:
+                return AgentResponse(
+                    query=request.query,
+                    intent=intent.value,
+                    reasoning=intent_reasoning,
+                    tool_calls=[],
+                    results={},
+                    confidence=0.2,
+                    user_confirmation_needed=request.require_confirmation and self.hitl_enabled,
+                    next_steps="Please rephrase your request, e.g. 'scan \"<folder>\"', "
+                               "'find files similar to \"<file>\"' or 'show recent files'",
+                    error=None
+                )
+            
             logging.info(f"Planned {len(tool_calls)} tool calls")
             
             # Step 3 & 4: ACT & OBSERVE - Execute tools
@@ -45,10 +98,7 @@ class PlannerAgent:
                 
                 try:
                     logging.info(f"Executing tool: {tool_call.tool.value}")
-                    result = await self.tool_registry.execute_tool(
-                        tool_call.tool.value,
-                        **tool_call.parameters
-                    )
+                    result = await self._run_tool(tool_call)
                     results[tool_call.tool.value] = result
                     
                     if not result.get("success"):
@@ -75,7 +125,7 @@ class PlannerAgent:
                 query=request.query,
                 intent=intent.value,
                 reasoning=f"{intent_reasoning}. {eval_message}",
-                tool_calls=tool_calls,
+                tool_calls=list(tool_calls),
                 results=results,
                 confidence=confidence,
                 user_confirmation_needed=user_confirmation_needed,
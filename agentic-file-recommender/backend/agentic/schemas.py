@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Dict, Any, Optional
 from enum import Enum
 
@@ -10,20 +10,33 @@ class ToolName(str, Enum):
     GET_FILES = "get_files"
     ANALYZE_ACTIVITY = "analyze_activity"
 
+    @property
+    def cacheable(self) -> bool:
+        """Read-only tools whose results may be reused for a short time."""
+        return self in _CACHEABLE_TOOLS
+
+_CACHEABLE_TOOLS = frozenset({ToolName.RECOMMEND, ToolName.GET_FILES, ToolName.ANALYZE_ACTIVITY})
+
 class ToolCall(BaseModel):
     """Represents a single tool call."""
+    model_config = ConfigDict(frozen=True)
+
     tool: ToolName
-    parameters: Dict[str, Any]
+    parameters: Dict[str, Any] = Field(default_factory=dict)
     reasoning: str
 
 class AgentRequest(BaseModel):
     """User request to the agent."""
+    model_config = ConfigDict(frozen=True)
+
     query: str
     require_confirmation: bool = True
     max_planning_steps: int = 3
 
 class AgentResponse(BaseModel):
     """Agent response with planning trace."""
+    model_config = ConfigDict(frozen=True)
+
     query: str
     intent: str
     reasoning: str
@@ -4,11 +4,40 @@ from pathlib import Path
 from ..agents.file_agent import FileAgent
 from ..agents.recommendation_agent import RecommendationAgent
 from ..agents.activity_agent import ActivityAgent
-from ..db import get_db
+from ..db import get_read_db
+from .schemas import ToolName
+
+_GET_FILES_SQL = "SELECT path FROM files ORDER BY last_scanned DESC LIMIT 100"
+
+# Both activity summaries in one statement; rows are tagged 'A' (most
+# accessed: path, count, last access) or 'P' (pair: path, co_count, path)
+_ACTIVITY_SUMMARY_SQL = """
+    WITH top_access AS (
+        SELECT 'A' AS tag, f.path AS path, fa.access_count AS cnt, fa.last_accessed AS extra
+        FROM file_activity fa
+        JOIN files f ON fa.file_id = f.id
+        ORDER BY fa.access_count DESC
+        LIMIT 10
+    ),
+    top_pairs AS (
+        SELECT 'P' AS tag, f1.path AS path, c.co_count AS cnt, f2.path AS extra
+        FROM file_cooccurrence c
+        JOIN files f1 ON c.file_id_1 = f1.id
+        JOIN files f2 ON c.file_id_2 = f2.id
+        ORDER BY c.co_count DESC
+        LIMIT 10
+    )
+    SELECT tag, path, cnt, extra FROM top_access
+    UNION ALL
+    SELECT tag, path, cnt, extra FROM top_pairs
+    ORDER BY tag, cnt DESC
+"""
 
 class ToolRegistry:
     """Registry of available tools (agents) that can be called."""
     
+    __slots__ = ('file_agent', 'recommendation_agent', 'activity_agent', 'config', 'tools')
+    
     def __init__(self, file_agent: FileAgent, recommendation_agent: RecommendationAgent, activity_agent: ActivityAgent, config: Dict):
         self.file_agent = file_agent
         self.recommendation_agent = recommendation_agent
@@ -16,14 +45,15 @@ class ToolRegistry:
         self.config = config
         self.tools = self._register_tools()
         
-    def _register_tools(self) -> Dict[str, Callable]:
-        """Register all available tools."""
+    def _register_tools(self) -> Dict[ToolName, Callable]:
+        """Register all available tools (bound methods, keyed by ToolName)."""
+        # ToolName is a str enum, so plain tool-name strings hit the same keys
         return {
-            "scan": self.tool_scan,
-            "recommend": self.tool_recommend,
-            "log_activity": self.tool_log_activity,
-            "get_files": self.tool_get_files,
-            "analyze_activity": self.tool_analyze_activity,
+            ToolName.SCAN: self.tool_scan,
+            ToolName.RECOMMEND: self.tool_recommend,
+            ToolName.LOG_ACTIVITY: self.tool_log_activity,
+            ToolName.GET_FILES: self.tool_get_files,
+            ToolName.ANALYZE_ACTIVITY: self.tool_analyze_activity,
         }
     
     async def tool_scan(self, path: str) -> Dict[str, Any]:
@@ -69,10 +99,8 @@ class ToolRegistry:
     async def tool_get_files(self, directory: str = None) -> Dict[str, Any]:
         """Get list of files in directory or scanned files."""
         try:
-            with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT path FROM files ORDER BY last_scanned DESC LIMIT 100")
-                files = [row[0] for row in cursor.fetchall()]
+            with get_read_db() as conn:
+                files = [row[0] for row in conn.execute(_GET_FILES_SQL).fetchall()]
             
             return {
                 "success": True,
@@ -87,63 +115,42 @@ class ToolRegistry:
     async def tool_analyze_activity(self) -> Dict[str, Any]:
         """Analyze user activity patterns."""
         try:
-            with get_db() as conn:
-                cursor = conn.cursor()
-                
-                # Get most accessed files
-                cursor.execute("""
-                    SELECT f.path, fa.access_count, fa.last_accessed
-                    FROM file_activity fa
-                    JOIN files f ON fa.file_id = f.id
-                    ORDER BY fa.access_count DESC
-                    LIMIT 10
-                """)
-                most_accessed = [
-                    {
-                        "path": row[0],
-                        "access_count": row[1],
-                        "last_accessed": row[2]
-                    }
-                    for row in cursor.fetchall()
-                ]
-                
-                # Get top co-occurrence pairs
-                cursor.execute("""
-                    SELECT f1.path, f2.path, co_count
-                    FROM file_cooccurrence
-                    JOIN files f1 ON file_id_1 = f1.id
-                    JOIN files f2 ON file_id_2 = f2.id
-                    ORDER BY co_count DESC
-                    LIMIT 10
-                """)
-                top_pairs = [
-                    {
-                        "file1": row[0],
-                        "file2": row[1],
-                        "co_count": row[2]
-                    }
-                    for row in cursor.fetchall()
-                ]
-                
-                return {
-                    "success": True,
-                    "most_accessed_files": most_accessed,
-                    "top_cooccurrence_pairs": top_pairs,
-                    "analysis": "Activity analysis complete"
-                }
+            most_accessed = []
+            top_pairs = []
+            with get_read_db() as conn:
+                rows = conn.execute(_ACTIVITY_SUMMARY_SQL).fetchall()
+            for tag, path, count, extra in rows:
+                if tag == 'A':
+                    most_accessed.append({
+                        "path": path,
+                        "access_count": count,
+                        "last_accessed": extra
+                    })
+                else:
+                    top_pairs.append({
+                        "file1": path,
+                        "file2": extra,
+                        "co_count": count
+                    })
+            
+            return {
+                "success": True,
+                "most_accessed_files": most_accessed,
+                "top_cooccurrence_pairs": top_pairs,
+                "analysis": "Activity analysis complete"
+            }
         except Exception as e:
             logging.error(f"Analyze activity tool error: {e}")
             return {"success": False, "error": str(e)}
     
     async def execute_tool(self, tool_name: str, **kwargs) -> Dict[str, Any]:
         """Execute a tool by name."""
-        if tool_name not in self.tools:
+        tool_func = self.tools.get(tool_name)
+        if tool_func is None:
             return {"success": False, "error": f"Unknown tool: {tool_name}"}
         
         try:
-            tool_func = self.tools[tool_name]
-            result = await tool_func(**kwargs)
-            return result
+            return await tool_func(**kwargs)
         except Exception as e:
             logging.error(f"Tool execution error for {tool_name}: {e}")
             return {"success": False, "error": str(e)}
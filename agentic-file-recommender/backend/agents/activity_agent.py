@@ -1,87 +1,108 @@
 import logging
 from datetime import datetime, timedelta
-from pathlib import Path
-from ..db import get_db, ensure_tables
-import sqlite3
+from ..db import get_read_db, get_write_tx, ensure_tables
 import asyncio
 
+# Statements run for every access event, kept as constants so the
+# connections' statement caches reuse their compiled form
+_FILE_ID_SQL = "SELECT id FROM files WHERE path = ?"
+_RECORD_ACCESS_SQL = """
+    INSERT INTO file_activity (file_id, last_accessed, access_count)
+    VALUES (?, ?, 1)
+    ON CONFLICT(file_id) DO UPDATE SET
+        last_accessed = excluded.last_accessed,
+        access_count = access_count + 1
+"""
+# Bump co-occurrence with every file accessed within the window before this
+# event, storing each pair as (min id, max id)
+_BUMP_COOCCURRENCE_SQL = """
+    INSERT INTO file_cooccurrence (file_id_1, file_id_2, co_count)
+    SELECT MIN(?, file_id), MAX(?, file_id), 1 FROM file_activity
+    WHERE file_id != ?
+    AND last_accessed >= ?
+    ON CONFLICT(file_id_1, file_id_2) DO UPDATE SET
+        co_count = co_count + 1
+"""
+
 class ActivityAgent:
+    # Seconds between background flushes of queued access events
+    FLUSH_INTERVAL = 0.5
+    # Max events written per transaction
+    FLUSH_BATCH = 500
+
     def __init__(self, config):
         self.config = config
-        self._lock = asyncio.Lock()
         self.cooccurrence_window = timedelta(minutes=5)
+        # (file_id, accessed_at) events waiting for the next flush
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._flush_task = None
         # Ensure tables exist
         ensure_tables()
 
     async def record_access(self, file_path: str) -> bool:
-        """Record file access and potential co-occurrences."""
+        """Queue a file access; it is written (with co-occurrences) by the next flush."""
         try:
-            async with self._lock:
-                with get_db() as conn:
-                    cursor = conn.cursor()
-                    
-                    # Get file_id
-                    cursor.execute("SELECT id FROM files WHERE path = ?", (str(file_path),))
-                    result = cursor.fetchone()
-                    if not result:
-                        logging.warning(f"No file record found for {file_path}")
-                        return False
-                    
-                    file_id = result[0]
-                    now = datetime.now()
-
-                    # Update activity
-                    cursor.execute("""
-                        INSERT INTO file_activity (file_id, last_accessed, access_count)
-                        VALUES (?, ?, 1)
-                        ON CONFLICT(file_id) DO UPDATE SET
-                            last_accessed = ?,
-                            access_count = access_count + 1
-                    """, (file_id, now, now))
+            with get_read_db() as conn:
+                result = conn.execute(_FILE_ID_SQL, (str(file_path),)).fetchone()
+            if not result:
+                logging.warning(f"No file record found for {file_path}")
+                return False
 
-                    # Find recent accesses for co-occurrence
-                    cursor.execute("""
-                        SELECT file_id FROM file_activity
-                        WHERE file_id != ? 
-                        AND last_accessed >= datetime('now', '-5 minutes')
-                    """, (file_id,))
-                    
-                    for row in cursor.fetchall():
-                        other_id = row[0]
-                        await self.record_cooccurrence(file_id, other_id)
-
-                    return True
+            self._queue.put_nowait((result[0], datetime.now()))
+            if self._flush_task is None:
+                # Not started (e.g. used outside the app): write through
+                await self.flush()
+            return True
 
         except Exception as e:
             logging.error(f"Error recording file access: {e}", exc_info=True)
             return False
 
-    async def record_cooccurrence(self, file_id_1: int, file_id_2: int):
-        """Record or update file co-occurrence."""
-        try:
-            if file_id_1 == file_id_2:
-                return
-                
-            # Ensure consistent ordering
-            if file_id_1 > file_id_2:
-                file_id_1, file_id_2 = file_id_2, file_id_1
+    def _write_events(self, events):
+        """Apply queued access events in order, all in one transaction."""
+        with get_write_tx() as conn:
+            cursor = conn.cursor()
+            for file_id, accessed_at in events:
+                cursor.execute(_RECORD_ACCESS_SQL, (file_id, accessed_at))
+                cursor.execute(_BUMP_COOCCURRENCE_SQL,
+                               (file_id, file_id, file_id, accessed_at - self.cooccurrence_window))
 
-            with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO file_cooccurrence (file_id_1, file_id_2, co_count)
-                    VALUES (?, ?, 1)
-                    ON CONFLICT(file_id_1, file_id_2) DO UPDATE SET
-                        co_count = co_count + 1
-                """, (file_id_1, file_id_2))
+    async def flush(self):
+        """Write all queued events, FLUSH_BATCH per transaction."""
+        while not self._queue.empty():
+            events = []
+            while len(events) < self.FLUSH_BATCH and not self._queue.empty():
+                events.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write_events, events)
+            except Exception as e:
+                logging.error(f"Error writing {len(events)} activity events: {e}", exc_info=True)
 
-        except Exception as e:
-            logging.error(f"Error recording co-occurrence: {e}")
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            await self.flush()
+
+    def start(self):
+        """Start the background flusher (call from the running event loop)."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def shutdown(self):
+        """Stop the background flusher and write whatever is still queued."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
 
     async def get_recent_activity(self, limit: int = 10):
         """Get recently accessed files."""
         try:
-            with get_db() as conn:
+            with get_read_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT f.path, fa.last_accessed, fa.access_count
@@ -2,12 +2,76 @@ import pathlib
 from datetime import datetime
 import logging
 import asyncio
-from ..utils import compute_file_hash, extract_text_snippet, get_file_type
-from ..db import get_db
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+from ..utils import compute_file_hash, extract_text_snippet, file_fingerprint, get_file_type
+from ..db import get_read_db, get_write_db
+
+# Shared pool for per-file hashing/snippet extraction (I/O bound, so oversubscribe cores)
+_SCAN_WORKERS = (os.cpu_count() or 1) * 2
+_SCAN_POOL = ThreadPoolExecutor(max_workers=_SCAN_WORKERS, thread_name_prefix="scan")
+
+def _iter_files(root: str, allowed_exts: frozenset) -> Iterator[Tuple[str, os.stat_result]]:
+    """Walk root with os.scandir, yielding (path, stat) for files with an allowed suffix."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in allowed_exts and entry.is_file():
+                            yield entry.path, entry.stat()
+                    except OSError as e:
+                        logging.warning(f"Skipping {entry.path}: {e}")
+        except OSError as e:
+            logging.warning(f"Cannot read directory {directory}: {e}")
+
+def _process_one(path: str, stat: os.stat_result, snippet_bytes: int,
+                 known: Optional[Tuple[str, str, bool]] = None) -> Optional[Tuple]:
+    """
+    Hash, type and snippet a single file; runs on the scan pool.
+    `known` is the stored (hash, file_type, has_content) of an unchanged file:
+    its hash is reused and the snippet is only read if no embedding exists yet.
+    """
+    try:
+        file_path = pathlib.Path(path)
+        if known:
+            file_hash, file_type, has_content = known
+        else:
+            file_hash, file_type, has_content = compute_file_hash(file_path), get_file_type(file_path), False
+        return (
+            path,
+            file_hash,
+            file_type,
+            datetime.fromtimestamp(stat.st_mtime),
+            stat.st_size,
+            stat.st_mtime_ns,
+            None if has_content else extract_text_snippet(file_path, snippet_bytes)
+        )
+    except Exception as e:
+        logging.error(f"Error processing file {path}: {e}")
+        return None
 
 class FileAgent:
+    # Max concurrent store_embeddings_batch calls during a scan
+    EMBED_CONCURRENCY = 4
+    # Bound on each scan pipeline queue (paths, processed rows)
+    QUEUE_SIZE = 256
+    # Directory entries pulled from the walker per executor call
+    WALK_BATCH = 64
+    # Rows per executemany transaction
+    WRITE_BATCH = 100
+    # Paths per "IN (...)" lookup, below SQLite's bound-variable limit
+    LOOKUP_CHUNK = 500
+
     def __init__(self, config):
         self.config = config
+        self.allowed_exts = frozenset(ext.lower() for ext in config["scan"]["allowed_exts"])
         self.recommendation_agent = None
         self._lock = asyncio.Lock()
 
@@ -16,6 +80,158 @@ class FileAgent:
         self.recommendation_agent = agent
         logging.info("Recommendation agent set successfully")
 
+    def _insert_files(self, rows: List[Tuple]) -> Dict[str, int]:
+        """Insert scanned file rows in a single transaction and return their ids by path."""
+        if not rows:
+            return {}
+
+        # One BEGIN IMMEDIATE transaction, committed when the block exits
+        with get_write_db() as conn:
+            # Upsert keeps the existing id, so embeddings and activity
+            # of unchanged files stay attached
+            conn.executemany("""
+                INSERT INTO files 
+                (path, path_norm, hash, file_type, last_modified, size, mtime_ns, last_scanned)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    hash = excluded.hash,
+                    file_type = excluded.file_type,
+                    last_modified = excluded.last_modified,
+                    size = excluded.size,
+                    mtime_ns = excluded.mtime_ns,
+                    last_scanned = excluded.last_scanned
+            """, rows)
+
+        with get_read_db() as conn:
+            cursor = conn.cursor()
+            file_ids = {}
+            paths = [row[0] for row in rows]
+            for i in range(0, len(paths), self.LOOKUP_CHUNK):
+                chunk = paths[i:i + self.LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(f"SELECT id, path FROM files WHERE path IN ({placeholders})", chunk)
+                file_ids.update((path, file_id) for file_id, path in cursor.fetchall())
+
+        return file_ids
+
+    def _load_known_files(self, paths: List[str]) -> Dict[str, Tuple]:
+        """Map path -> (size, mtime_ns, hash, file_type, has_content) for those of paths already scanned."""
+        known_files = {}
+        with get_read_db() as conn:
+            for i in range(0, len(paths), self.LOOKUP_CHUNK):
+                chunk = paths[i:i + self.LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = conn.execute(f"""
+                    SELECT f.path, f.size, f.mtime_ns, f.hash, f.file_type,
+                           fc.embedding_vector IS NOT NULL
+                    FROM files f
+                    LEFT JOIN file_content fc ON f.id = fc.file_id
+                    WHERE f.path IN ({placeholders})
+                """, chunk)
+                known_files.update((row[0], row[1:]) for row in cursor)
+        return known_files
+
+    async def _run_scan_pipeline(self, root: pathlib.Path, snippet_bytes: int):
+        """
+        Scan as a pipeline joined by bounded queues:
+        walker -> hash workers (thread pool) -> batched DB writer -> embedders.
+        All stages run concurrently, so wall-clock is set by the slowest one.
+        """
+        loop = asyncio.get_running_loop()
+        paths_q: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        rows_q: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        embed_semaphore = asyncio.Semaphore(self.EMBED_CONCURRENCY)
+        embed_tasks = []
+        # (file_id, text) pairs waiting for a full embedding batch
+        to_embed = []
+
+        def unchanged(known, path, stat):
+            """Stored (hash, file_type, has_content) if size and mtime_ns still match."""
+            if known and (known[0], known[1]) == file_fingerprint(path, stat):
+                return known[2], known[3], bool(known[4])
+            return None
+
+        async def produce():
+            walker = _iter_files(str(root), self.allowed_exts)
+            while True:
+                batch = await loop.run_in_executor(_SCAN_POOL, lambda: list(islice(walker, self.WALK_BATCH)))
+                if not batch:
+                    break
+                # Stored fingerprints of just this walk batch, read off the event loop
+                known_files = await asyncio.to_thread(self._load_known_files, [path for path, _ in batch])
+                for path, stat in batch:
+                    await paths_q.put((path, stat, unchanged(known_files.get(path), path, stat)))
+            for _ in range(_SCAN_WORKERS):
+                await paths_q.put(None)
+
+        async def process():
+            while (entry := await paths_q.get()) is not None:
+                path, stat, known = entry
+                result = await loop.run_in_executor(
+                    _SCAN_POOL, _process_one, path, stat, snippet_bytes, known
+                )
+                if result is not None:
+                    await rows_q.put(result)
+            await rows_q.put(None)
+
+        async def embed(items):
+            async with embed_semaphore:
+                await self.recommendation_agent.store_embeddings_batch(items)
+
+        def start_embedding():
+            if to_embed:
+                embed_tasks.append(asyncio.create_task(embed(to_embed.copy())))
+                to_embed.clear()
+
+        async def flush(batch):
+            scanned_at = datetime.now()
+            # The write transaction and id lookup run off the event loop
+            file_ids = await asyncio.to_thread(self._insert_files, [
+                (path, os.path.normcase(path), file_hash, file_type, last_modified, size, mtime_ns, scanned_at)
+                for path, file_hash, file_type, last_modified, size, mtime_ns, _ in batch
+            ])
+            if self.recommendation_agent:
+                # Embed in full model batches rather than per written batch:
+                # on a rescan most written rows carry no new text
+                to_embed.extend((file_ids[path], text) for path, *_, text in batch if text and path in file_ids)
+                if len(to_embed) >= self.recommendation_agent.batch_size:
+                    start_embedding()
+
+        async def write():
+            batch = []
+            finished = 0
+            while finished < _SCAN_WORKERS:
+                row = await rows_q.get()
+                if row is None:
+                    finished += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= self.WRITE_BATCH:
+                    await flush(batch)
+                    batch = []
+            if batch:
+                await flush(batch)
+            start_embedding()
+
+        stages = [
+            asyncio.create_task(produce()),
+            *(asyncio.create_task(process()) for _ in range(_SCAN_WORKERS)),
+            asyncio.create_task(write())
+        ]
+        try:
+            await asyncio.gather(*stages)
+            await asyncio.gather(*embed_tasks)
+            if self.recommendation_agent:
+                # Annoy is rebuilt once per scan, off the event loop
+                await self.recommendation_agent.flush()
+                # Paths, mtimes and embeddings may all have changed
+                self.recommendation_agent.invalidate_cache()
+        except BaseException:
+            # A failed stage would leave the others blocked on their queues
+            for task in stages + embed_tasks:
+                task.cancel()
+            raise
+
     async def scan_directory(self, root_path: str):
         """Scan directory and update database with proper locking."""
         try:
@@ -25,39 +241,10 @@ class FileAgent:
             if not root.is_dir():
                 raise ValueError(f"Path must be a directory: {root_path}")
 
-            async with self._lock:
-                for path in root.rglob("*"):
-                    if not path.is_file() or path.suffix.lower() not in self.config["scan"]["allowed_exts"]:
-                        continue
+            snippet_bytes = self.config["scan"]["snippet_bytes"]
 
-                    try:
-                        # New DB connection per file
-                        with get_db() as conn:
-                            cursor = conn.cursor()
-                            file_hash = compute_file_hash(path)
-                            file_type = get_file_type(path)
-                            
-                            cursor.execute("""
-                                INSERT OR REPLACE INTO files 
-                                (path, hash, file_type, last_modified, last_scanned)
-                                VALUES (?, ?, ?, ?, ?)
-                            """, (
-                                str(path),
-                                file_hash,
-                                file_type,
-                                datetime.fromtimestamp(path.stat().st_mtime),
-                                datetime.now()
-                            ))
-                            
-                            file_id = cursor.lastrowid
-                            
-                            text = extract_text_snippet(path, self.config["scan"]["snippet_bytes"])
-                            if text and self.recommendation_agent:
-                                await self.recommendation_agent.store_embedding(file_id, text)
-                                
-                    except Exception as e:
-                        logging.error(f"Error processing file {path}: {e}")
-                        continue
+            async with self._lock:
+                await self._run_scan_pipeline(root, snippet_bytes)
 
             logging.info(f"Completed scanning directory: {root_path}")
             return True
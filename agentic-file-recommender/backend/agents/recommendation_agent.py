@@ -1,19 +1,51 @@
-from sentence_transformers import SentenceTransformer
 from annoy import AnnoyIndex
 import numpy as np
+import json
 import logging
+import os
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict
-from ..db import get_db
+from typing import TYPE_CHECKING, List, Dict, Tuple
+from ..db import DB_PATH, get_read_db, get_write_db
 from ..utils import extract_text_snippet
+from ..similarity_cache import SimilarityCache
 import sqlite3
 import time
 import asyncio
-from datetime import datetime, timedelta
 import math
 import random
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# Loaded models by name, shared by every agent in the process
+_MODEL_CACHE: Dict[str, "SentenceTransformer"] = {}
+
+def _load_model(model_name: str, max_seq_length: int) -> "SentenceTransformer":
+    """Load a SentenceTransformer once per process and return the shared instance."""
+    model = _MODEL_CACHE.get(model_name)
+    if model is None:
+        # Imported here: sentence_transformers pulls in torch, which alone
+        # takes seconds, and importing this module shouldn't pay for it
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+        # Longer inputs are truncated; tokenization and attention cost grow with this
+        if max_seq_length:
+            model.max_seq_length = max_seq_length
+        _MODEL_CACHE[model_name] = model
+    return model
+
 class RecommendationAgent:
+    # ANN candidates fetched per requested recommendation before rescoring
+    CANDIDATE_FACTOR = 10
+    # Embeddings are stored as int8 components, each row scaled so its
+    # largest component maps to this (the scale goes in file_content.emb_scale)
+    EMBEDDING_SCALE = 127
+    # Paths/ids per "IN (...)" list; the co-occurrence query binds two lists
+    # plus the query path, still below SQLite's bound-variable limit
+    LOOKUP_CHUNK = 400
+
     def __init__(self, config):
         if not config or "embeddings" not in config:
             raise ValueError("Invalid config: missing embeddings section")
@@ -23,58 +55,290 @@ class RecommendationAgent:
         self.dim = config["embeddings"].get("dim", 384)
         
         try:
-            self.model = SentenceTransformer(self.model_name)
+            self.model = _load_model(self.model_name, config["embeddings"].get("max_seq_length", 256))
         except Exception as e:
             logging.error(f"Failed to load SentenceTransformer model: {e}")
             raise
             
+        # Corpora up to this size are scored exactly with one matrix-vector
+        # product; larger ones take their candidates from the Annoy index
+        self.exact_search_max = config["embeddings"].get("exact_search_max", 20000)
+        # Texts per forward pass when embedding many files at once
+        self.batch_size = config["embeddings"].get("batch_size", 64)
+        # Query texts repeat across requests; reuse their model output
+        self._embed_query = lru_cache(maxsize=config["embeddings"].get("query_cache_size", 256))(self._embed_query_uncached)
+        # Ranked results by (query path, limit), LRU; an entry is reused until
+        # its TTL runs out (recency and co-occurrence drift) or invalidate_cache()
+        self.result_cache_size = config["embeddings"].get("result_cache_size", 1024)
+        self.result_cache_ttl = config["embeddings"].get("result_cache_ttl", 30)
+        self._results: OrderedDict = OrderedDict()
+        self._cache_version = 0
+        # Candidate items of recent vector searches; a query embedding close
+        # enough to a cached one reuses its candidates and skips the search
+        self._candidates = SimilarityCache(
+            self.dim,
+            capacity=config["embeddings"].get("similarity_cache_size", 256),
+            threshold=config["embeddings"].get("similarity_cache_threshold", 0.92)
+        )
+        
+        # The built Annoy index, embedding matrix and item map are saved here
+        # so a restart can skip decoding every embedding and rebuilding
+        index_dir = Path(config["embeddings"].get("index_dir", DB_PATH.parent))
+        self._index_path = index_dir / "files.ann"
+        self._matrix_path = index_dir / "files.npy"
+        self._meta_path = index_dir / "files.json"
+        
         self.index = AnnoyIndex(self.dim, 'angular')
         self.file_id_map = {}
-        self._load_embeddings()
+        # Set while flush() rebuilds the Annoy index on a worker thread
+        self._rebuilding = False
+        self._reset_vectors(np.empty((0, self.dim), dtype=np.float32))
+        # Set once the activity tables exist (they may be created after this agent)
+        self._has_cooccurrence_table = False
+        if not self._load_saved_index():
+            self._load_embeddings()
 
     def _load_embeddings(self):
         """Load embeddings with error handling."""
         try:
-            with get_db() as conn:
-                conn.row_factory = sqlite3.Row  # Enable dictionary access
+            with get_read_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
-                    SELECT f.id, f.path, fc.embedding_vector 
+                    SELECT f.id, f.path, fc.embedding_vector, fc.emb_scale
                     FROM files f 
                     JOIN file_content fc ON f.id = fc.file_id
                     WHERE fc.embedding_vector IS NOT NULL
                 """)
-                
-                self.index = AnnoyIndex(self.dim, 'angular')
-                self.file_id_map.clear()
-                
                 rows = cursor.fetchall()
-                if not rows:
-                    logging.warning("No embeddings found in database")
-                    return
-
-                for idx, row in enumerate(rows):
-                    try:
-                        embedding = np.frombuffer(row['embedding_vector'], dtype=np.float32)
-                        if len(embedding) == self.dim:  # Verify embedding dimension
-                            self.index.add_item(idx, embedding)
-                            self.file_id_map[idx] = {
-                                "id": row['id'],
-                                "path": str(row['path'])
-                            }
-                    except Exception as e:
-                        logging.error(f"Error loading embedding for file {row['path']}: {e}")
-                        continue
 
-                if len(self.file_id_map) > 0:
-                    self.index.build(10)
-                    logging.info(f"Successfully loaded {len(self.file_id_map)} embeddings")
-                else:
-                    logging.warning("No valid embeddings could be loaded")
+            self.index = AnnoyIndex(self.dim, 'angular')
+            self.file_id_map.clear()
+            self._reset_vectors(np.empty((0, self.dim), dtype=np.float32))
+            
+            if not rows:
+                logging.warning("No embeddings found in database")
+                return
+
+            # Blob size tells the format apart: int8 rows, or float32 rows
+            # written before embeddings were quantized; anything else is skipped
+            quantized = [row for row in rows if len(row['embedding_vector']) == self.dim]
+            legacy = [row for row in rows if len(row['embedding_vector']) == self.dim * 4]
+            valid = quantized + legacy
+            if len(valid) < len(rows):
+                logging.warning(f"Skipped {len(rows) - len(valid)} embeddings with unexpected size")
+            if not valid:
+                logging.warning("No valid embeddings could be loaded")
+                return
+
+            # One buffer and one conversion per format instead of per row
+            matrix = np.empty((len(valid), self.dim), dtype=np.float32)
+            if quantized:
+                blob = b"".join(row['embedding_vector'] for row in quantized)
+                # Rows quantized before emb_scale existed used a fixed 1/127
+                scales = np.array([row['emb_scale'] or 1.0 / self.EMBEDDING_SCALE for row in quantized],
+                                  dtype=np.float32)
+                matrix[:len(quantized)] = self._dequantize(
+                    np.frombuffer(blob, dtype=np.int8).reshape(-1, self.dim), scales)
+            if legacy:
+                blob = b"".join(row['embedding_vector'] for row in legacy)
+                matrix[len(quantized):] = np.frombuffer(blob, dtype=np.float32).reshape(-1, self.dim)
+            matrix = self._normalize_rows(matrix)
+
+            # Annoy item i is row i of the embedding matrix
+            for item, vector in enumerate(matrix):
+                self.index.add_item(item, vector)
+            self.file_id_map.update(
+                (item, {"id": row['id'], "path": row['path']}) for item, row in enumerate(valid)
+            )
+            self.index.build(10)
+            self._reset_vectors(matrix)
+            logging.info(f"Successfully loaded {len(self.file_id_map)} embeddings")
+            self._index_saved = self._save_index(matrix, self._item_entries())
 
         except Exception as e:
             logging.error(f"Failed to load embeddings: {e}", exc_info=True)
             self.file_id_map.clear()
+            self._reset_vectors(np.empty((0, self.dim), dtype=np.float32))
+
+    def _reset_vectors(self, matrix: np.ndarray):
+        """Replace the in-memory vectors with a matrix matching the current index and file_id_map."""
+        # Growable buffer; _emb_matrix is a view of its filled rows, which are
+        # the unit-length embeddings with row i == Annoy item i
+        self._emb_buffer = matrix
+        self._emb_matrix = matrix
+        self._item_by_file_id = {entry["id"]: item for item, entry in self.file_id_map.items()}
+        self._item_by_path = {entry["path"]: item for item, entry in self.file_id_map.items()}
+        # Rows added or changed since the Annoy index was last built
+        self._pending_items = set()
+        # Whether the files under index_dir match the index, matrix and map
+        self._index_saved = False
+
+    def _add_vector(self, file_id: int, path: str, embedding: np.ndarray):
+        """Make a newly stored embedding searchable without reloading or rebuilding."""
+        item = self._item_by_file_id.get(file_id)
+        if item is None:
+            item = len(self._emb_matrix)
+            if item == len(self._emb_buffer):
+                # Amortized growth instead of a full copy per insert
+                grown = np.empty((max(2 * item, 64), self.dim), dtype=np.float32)
+                grown[:item] = self._emb_buffer[:item]
+                self._emb_buffer = grown
+            self._emb_matrix = self._emb_buffer[:item + 1]
+            self._item_by_file_id[file_id] = item
+        self.file_id_map[item] = {"id": file_id, "path": path}
+        self._item_by_path[path] = item
+        self._emb_buffer[item] = self._normalize_rows(embedding)
+        # Searched exactly next to the ANN results until the next flush()
+        self._pending_items.add(item)
+        self._index_saved = False
+        self.invalidate_cache()
+
+    def _item_entries(self) -> list:
+        """[file_id, path] per row of the embedding matrix, as saved in the index metadata."""
+        return [[self.file_id_map[item]["id"], self.file_id_map[item]["path"]]
+                for item in range(len(self._emb_matrix))]
+
+    async def flush(self):
+        """Rebuild the Annoy index on a worker thread if any vectors are pending, and save it."""
+        if self._rebuilding:
+            # Whatever is pending now waits for the next flush
+            return
+        if not self._pending_items:
+            # Same vectors, but a rescan moves the fingerprint
+            if self._index_saved:
+                await asyncio.to_thread(self._save_index_meta, self._item_entries())
+            return
+        # Build from a snapshot; rows stored meanwhile stay pending
+        matrix, entries = self._emb_matrix.copy(), self._item_entries()
+        pending, self._pending_items = self._pending_items, set()
+        # _rank leaves self.index alone (exact search) until the thread is done
+        self._rebuilding = True
+        try:
+            saved = await asyncio.to_thread(self._rebuild_index, matrix, entries)
+        except Exception:
+            self._pending_items |= pending
+            raise
+        self._index_saved = saved and not self._pending_items
+
+    def _rebuild_index(self, matrix: np.ndarray, entries: list) -> bool:
+        """Build an Annoy index over matrix, swap it in and save it; runs on a worker thread."""
+        try:
+            index = AnnoyIndex(self.dim, 'angular')
+            for item, vector in enumerate(matrix):
+                index.add_item(item, vector)
+            index.build(10)
+            old_index, self.index = self.index, index
+            # Release the old index's memory map before its file is overwritten
+            old_index.unload()
+            logging.info(f"Rebuilt ANN index with {len(matrix)} embeddings")
+            return self._save_index(matrix, entries)
+        finally:
+            self._rebuilding = False
+
+    def _index_fingerprint(self) -> list:
+        """Summary of the stored embeddings that changes whenever a scan writes to the database."""
+        with get_read_db() as conn:
+            row = conn.execute("""
+                SELECT (SELECT MAX(file_id) FROM file_content),
+                       (SELECT MAX(last_scanned) FROM files)
+            """).fetchone()
+        return [row[0], row[1]]
+
+    def _save_index_meta(self, entries: list):
+        """Write the item map and current fingerprint next to the saved index."""
+        meta = {
+            "dim": self.dim,
+            "fingerprint": self._index_fingerprint(),
+            "items": entries
+        }
+        tmp_path = self._meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _save_index(self, matrix: np.ndarray, entries: list) -> bool:
+        """Persist the built Annoy index with the matrix and item map it was built from."""
+        try:
+            self._meta_path.parent.mkdir(parents=True, exist_ok=True)
+            # The saved files are only trusted once the metadata is written last
+            self._meta_path.unlink(missing_ok=True)
+            self.index.save(str(self._index_path))
+            np.save(self._matrix_path, matrix)
+            self._save_index_meta(entries)
+            return True
+        except Exception as e:
+            logging.warning(f"Could not save ANN index to {self._index_path}: {e}")
+            return False
+
+    def _load_saved_index(self) -> bool:
+        """Load the saved index if it matches the database; False if a rebuild is needed."""
+        try:
+            if not self._meta_path.exists():
+                return False
+            with open(self._meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("dim") != self.dim or meta.get("fingerprint") != self._index_fingerprint():
+                logging.info("Saved ANN index is out of date, rebuilding")
+                return False
+            items = meta["items"]
+            matrix = np.load(self._matrix_path)
+            if matrix.shape != (len(items), self.dim):
+                return False
+            index = AnnoyIndex(self.dim, 'angular')
+            index.load(str(self._index_path))  # memory-mapped, no build
+            if index.get_n_items() != len(items):
+                index.unload()
+                return False
+        except Exception as e:
+            logging.warning(f"Could not load saved ANN index, rebuilding: {e}")
+            return False
+
+        self.index = index
+        self.file_id_map.clear()
+        self.file_id_map.update(
+            (item, {"id": file_id, "path": path}) for item, (file_id, path) in enumerate(items)
+        )
+        self._reset_vectors(np.ascontiguousarray(matrix, dtype=np.float32))
+        self._index_saved = True
+        logging.info(f"Loaded saved ANN index with {len(items)} embeddings")
+        return True
+
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        """Scale each row to unit length (zero rows stay zero) as contiguous float32."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return np.ascontiguousarray(matrix / np.where(norms > 0, norms, 1.0), dtype=np.float32)
+
+    def _quantize(self, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Quantize embedding rows to int8 (4x smaller than float32), each with
+        its own scale so the full int8 range is used; returns (int8 rows, scales).
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        peak = np.abs(embeddings).max(axis=-1)
+        scales = np.where(peak > 0, peak / self.EMBEDDING_SCALE, 1.0).astype(np.float32)
+        scaled = np.rint(embeddings / scales[..., np.newaxis])
+        return np.clip(scaled, -self.EMBEDDING_SCALE, self.EMBEDDING_SCALE).astype(np.int8), scales
+
+    def _dequantize(self, quantized: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        """Float32 rows back from int8 quantized embeddings and their scales."""
+        return quantized.astype(np.float32) * np.asarray(scales, dtype=np.float32)[..., np.newaxis]
+
+    def _write_embeddings(self, rows: List[Tuple[int, str, bytes, float]]) -> Dict[int, str]:
+        """Upsert (file_id, preview, embedding blob, scale) rows and return the stored files' paths by id."""
+        # One BEGIN IMMEDIATE transaction for the whole batch, committed on exit
+        with get_write_db() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO file_content (file_id, content_preview, embedding_vector, emb_scale)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+        with get_read_db() as conn:
+            cursor = conn.cursor()
+            placeholders = ",".join("?" * len(rows))
+            cursor.execute(f"SELECT id, path FROM files WHERE id IN ({placeholders})",
+                           [row[0] for row in rows])
+            return dict(cursor.fetchall())
 
     async def store_embedding(self, file_id: int, text: str, max_retries: int = 5) -> bool:
         """Store embedding with retry logic."""
@@ -83,22 +347,21 @@ class RecommendationAgent:
             return False
 
         try:
-            embedding = self.compute_embedding(text)
+            embedding = await asyncio.to_thread(self.compute_embedding, text)
             if len(embedding) != self.dim:
                 logging.error(f"Invalid embedding dimension for file_id {file_id}")
                 return False
+            quantized, scale = self._quantize(embedding)
 
             for attempt in range(max_retries):
                 try:
-                    with get_db() as conn:
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                            INSERT OR REPLACE INTO file_content (file_id, content_preview, embedding_vector)
-                            VALUES (?, ?, ?)
-                        """, (file_id, text[:1000], embedding.tobytes()))
+                    path_by_id = await asyncio.to_thread(
+                        self._write_embeddings, [(file_id, text[:1000], quantized.tobytes(), float(scale))]
+                    )
                         
-                    # Reload embeddings after successful storage
-                    self._load_embeddings()
+                    # Index the new vector in memory (Annoy is rebuilt in batches)
+                    if file_id in path_by_id:
+                        self._add_vector(file_id, path_by_id[file_id], self._dequantize(quantized, scale))
                     logging.info(f"Successfully stored and indexed embedding for file_id {file_id}")
                     return True
 
@@ -113,224 +376,348 @@ class RecommendationAgent:
             logging.error(f"Error storing embedding for file_id {file_id}: {e}", exc_info=True)
             return False
 
+    async def store_embeddings_batch(self, items: List[Tuple[int, str]], max_retries: int = 5) -> int:
+        """Embed many (file_id, text) pairs in batched forward passes and store them together; returns the count stored."""
+        items = [(file_id, text) for file_id, text in items if text.strip()]
+        if not items:
+            return 0
+
+        try:
+            # Encoding is the slow part; keep it off the event loop
+            embeddings = await asyncio.to_thread(
+                self.compute_embeddings_batch, [text for _, text in items]
+            )
+            if embeddings.shape[1] != self.dim:
+                logging.error(f"Invalid embedding dimension {embeddings.shape[1]} for batch of {len(items)} files")
+                return 0
+            quantized, scales = self._quantize(embeddings)
+
+            for attempt in range(max_retries):
+                try:
+                    path_by_id = await asyncio.to_thread(self._write_embeddings, [
+                        (file_id, text[:1000], row.tobytes(), scale)
+                        for (file_id, text), row, scale in zip(items, quantized, scales.tolist())
+                    ])
+
+                    # Index what a reload would see, not the unquantized vectors
+                    for (file_id, _), embedding in zip(items, self._dequantize(quantized, scales)):
+                        if file_id in path_by_id:
+                            self._add_vector(file_id, path_by_id[file_id], embedding)
+                    logging.info(f"Successfully stored and indexed {len(items)} embeddings")
+                    return len(items)
+
+                except sqlite3.OperationalError as e:
+                    if "database is locked" in str(e) and attempt < max_retries - 1:
+                        wait_time = 0.3 * (attempt + 1)
+                        await asyncio.sleep(wait_time)
+                        continue
+                    raise
+
+        except Exception as e:
+            logging.error(f"Error storing embeddings for {len(items)} files: {e}", exc_info=True)
+            return 0
+
     def compute_embedding(self, text: str) -> np.ndarray:
-        """Compute embedding for text."""
-        return self.model.encode(text, show_progress_bar=False)
+        """Compute a unit-length embedding for text."""
+        return self.model.encode(text, show_progress_bar=False, normalize_embeddings=True)
+
+    def _embed_query_uncached(self, text: str) -> np.ndarray:
+        """Embedding of a query text, read-only so the cached array can be shared."""
+        embedding = self.compute_embedding(text)
+        embedding.setflags(write=False)
+        return embedding
+
+    def compute_embeddings_batch(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        """Compute unit-length embeddings for many texts, one row per text."""
+        return self.model.encode(
+            texts,
+            batch_size=batch_size or self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
     
-    async def _get_recency_score(self, file_path: str) -> float:
-        """Compute recency score (0-1) using both modification and access times."""
+    def _get_recency_scores_bulk(self, paths: List[str]) -> Dict[str, float]:
+        """Compute recency scores (0-1) for many files from a single query, keyed by path."""
+        if not paths:
+            return {}
         try:
-            with get_db() as conn:
-                conn.row_factory = sqlite3.Row
+            with get_read_db() as conn:
                 cursor = conn.cursor()
                 
-                # Get both modification time and last access time
-                cursor.execute("""
-                    SELECT f.last_modified, fa.last_accessed
-                    FROM files f
-                    LEFT JOIN file_activity fa ON f.id = fa.file_id
-                    WHERE f.path = ?
-                """, (str(file_path),))
-                
-                result = cursor.fetchone()
-                if not result:
-                    return 0.0
-                
-                now = datetime.now()
-                
-                # Calculate modification recency score
-                try:
-                    last_modified = datetime.fromisoformat(result['last_modified'])
-                    days_since_modified = (now - last_modified).days
-                    modification_score = max(0.0, min(1.0, math.exp(-days_since_modified / 30)))
-                except (TypeError, ValueError):
-                    modification_score = 0.0
-                
-                # Calculate access recency score
-                access_score = 0.0
-                if result['last_accessed']:
-                    try:
-                        last_accessed = datetime.fromisoformat(result['last_accessed'])
-                        days_since_accessed = (now - last_accessed).days
-                        # Faster decay for access (15-day half-life vs 30-day for modification)
-                        access_score = max(0.0, min(1.0, math.exp(-days_since_accessed / 15)))
-                    except (TypeError, ValueError):
-                        access_score = 0.0
-                
-                # Combine scores: give more weight to recent access (60%) than modification (40%)
-                # Recent access reflects current user interest
-                # Recent modification reflects content freshness
-                combined_score = (0.4 * modification_score) + (0.6 * access_score)
-                
-                logging.debug(
-                    f"Recency for {file_path}: "
-                    f"modification={modification_score:.3f}, "
-                    f"access={access_score:.3f}, "
-                    f"combined={combined_score:.3f}"
-                )
-                
-                return combined_score
+                # Calendar days since modification and last access, computed by
+                # SQLite (NULL if missing or unparsable) instead of parsing
+                # every timestamp in Python
+                rows = []
+                for i in range(0, len(paths), self.LOOKUP_CHUNK):
+                    chunk = paths[i:i + self.LOOKUP_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor.execute(f"""
+                        SELECT f.path,
+                               julianday('now', 'localtime', 'start of day') - julianday(f.last_modified, 'start of day'),
+                               julianday('now', 'localtime', 'start of day') - julianday(fa.last_accessed, 'start of day')
+                        FROM files f
+                        LEFT JOIN file_activity fa ON f.id = fa.file_id
+                        WHERE f.path IN ({placeholders})
+                    """, chunk)
+                    rows.extend(cursor.fetchall())
+            
+            days = np.array([(row[1], row[2]) for row in rows], dtype=np.float64).reshape(-1, 2)
+            days[np.isnan(days)] = np.inf
+            days_modified, days_accessed = days[:, 0], days[:, 1]
+            
+            # Faster decay for access (15-day half-life vs 30-day for modification)
+            modification_scores = np.clip(np.exp(-days_modified / 30), 0.0, 1.0)
+            access_scores = np.clip(np.exp(-days_accessed / 15), 0.0, 1.0)
+            
+            # Combine scores: give more weight to recent access (60%) than modification (40%)
+            # Recent access reflects current user interest
+            # Recent modification reflects content freshness
+            combined = 0.4 * modification_scores + 0.6 * access_scores
+            
+            return {row[0]: score for row, score in zip(rows, combined.tolist())}
                 
         except Exception as e:
-            logging.error(f"Error computing recency score for {file_path}: {e}", exc_info=True)
-            return 0.0
+            logging.error(f"Error computing recency scores: {e}", exc_info=True)
+            return {}
 
-    async def _get_cooccurrence_score(self, query_path: str, candidate_path: str) -> float:
-        """Compute co-occurrence score (0-1) based on file access patterns."""
-        try:
-            with get_db() as conn:
-                conn.row_factory = sqlite3.Row
+    def _cooccurrence_table_exists(self) -> bool:
+        """Check for the file_cooccurrence table once it exists, then remember it."""
+        if not self._has_cooccurrence_table:
+            with get_read_db() as conn:
                 cursor = conn.cursor()
-                
-                # Get file IDs
-                cursor.execute("SELECT id FROM files WHERE path = ?", (str(query_path),))
-                query_result = cursor.fetchone()
-                
-                cursor.execute("SELECT id FROM files WHERE path = ?", (str(candidate_path),))
-                candidate_result = cursor.fetchone()
-                
-                if not query_result or not candidate_result:
-                    logging.warning(f"File not found in database")
-                    return -1.0  # No co-occurrence possible if files not in DB
-                
-                query_id = query_result[0]
-                candidate_id = candidate_result[0]
-                
-                # Check if activity_logs table exists
                 cursor.execute("""
                     SELECT name FROM sqlite_master 
                     WHERE type='table' AND name='file_cooccurrence'
                 """)
-                if not cursor.fetchone():
-                    logging.debug("file_cooccurrence table does not exist")
-                    return -1.0  # No co-occurrence data available
-                
-                # Query actual co-occurrence count
-                cursor.execute("""
-                    SELECT co_count FROM file_cooccurrence
-                    WHERE (file_id_1 = ? AND file_id_2 = ?)
-                       OR (file_id_1 = ? AND file_id_2 = ?)
-                """, (query_id, candidate_id, candidate_id, query_id))
-                
-                result = cursor.fetchone()
-                
-                # If no co-occurrence found, return negative score
-                if not result or result[0] is None:
-                    logging.debug(f"No co-occurrence between {query_path} and {candidate_path}")
-                    return -1.0  # Never accessed together
-                
-                cooccur = result[0]
-                
-                # Normalize using sigmoid function
-                cooccurrence_score = 2 / (1 + math.exp(-cooccur / 5)) - 1
-                
-                logging.debug(
-                    f"Co-occurrence for ({query_path}, {candidate_path}): "
-                    f"co_count={cooccur}, score={cooccurrence_score:.3f}"
-                )
+                self._has_cooccurrence_table = cursor.fetchone() is not None
+        return self._has_cooccurrence_table
+
+    def _get_cooccurrence_scores_bulk(self, query_path: str, candidate_ids: Dict[int, str]) -> Dict[str, float]:
+        """Compute co-occurrence scores (-1 or 0-1) with the query file for candidates given as {file_id: path}, keyed by path."""
+        # -1 means never accessed together (or no data available)
+        scores = {path: -1.0 for path in candidate_ids.values()}
+        if not candidate_ids:
+            return scores
+        try:
+            if not self._cooccurrence_table_exists():
+                logging.debug("file_cooccurrence table does not exist")
+                return scores
+            
+            with get_read_db() as conn:
+                cursor = conn.cursor()
                 
-                return cooccurrence_score
+                # Candidate ids are known from the index, so the query file's
+                # id is resolved inline and each chunk is one statement
+                ids = list(candidate_ids)
+                for i in range(0, len(ids), self.LOOKUP_CHUNK):
+                    chunk = ids[i:i + self.LOOKUP_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor.execute(f"""
+                        WITH q AS (SELECT id FROM files WHERE path = ?)
+                        SELECT CASE WHEN c.file_id_1 = q.id THEN c.file_id_2 ELSE c.file_id_1 END, c.co_count
+                        FROM file_cooccurrence c, q
+                        WHERE (c.file_id_1 = q.id AND c.file_id_2 IN ({placeholders}))
+                           OR (c.file_id_2 = q.id AND c.file_id_1 IN ({placeholders}))
+                    """, [query_path, *chunk, *chunk])
+                    
+                    for other_id, cooccur in cursor.fetchall():
+                        if cooccur is None:
+                            continue
+                        # Normalize using sigmoid function
+                        scores[candidate_ids[other_id]] = 2 / (1 + math.exp(-cooccur / 5)) - 1
+            
+            return scores
                 
         except Exception as e:
-            logging.error(f"Error computing co-occurrence score: {e}", exc_info=True)
-            return -1.0
+            logging.error(f"Error computing co-occurrence scores: {e}", exc_info=True)
+            return {path: -1.0 for path in candidate_ids.values()}
 
     async def recommend_similar(self, query_path: str, limit: int = 5) -> List[Dict]:
         """Find similar files using weighted multi-factor ranking."""
+        # Callers may pass a Path; every comparison below is against str paths
+        query_path = str(query_path)
+        key = (query_path, limit)
+        cached = self._results.get(key)
+        if cached is not None and cached[0] == self._cache_version and cached[1] > time.monotonic():
+            self._results.move_to_end(key)
+            return list(cached[2])
+        version = self._cache_version
         try:
-            # try to extract text from file on disk first
-            query_text = extract_text_snippet(Path(query_path))
-            if not query_text:
-                # fallback: try to read stored preview from database
-                try:
-                    with get_db() as conn:
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                            SELECT fc.content_preview
-                            FROM files f
-                            JOIN file_content fc ON f.id = fc.file_id
-                            WHERE f.path = ?
-                        """, (str(query_path),))
-                        row = cursor.fetchone()
-                        if row:
-                            # accommodate sqlite returning tuple or Row
-                            preview = row[0] if isinstance(row, (tuple, list)) else row['content_preview'] if hasattr(row, '__getitem__') else None
-                            if preview:
-                                query_text = preview
-                                logging.info(f"Using stored content_preview for {query_path}")
-                except Exception as e:
-                    logging.warning(f"DB preview lookup failed for {query_path}: {e}")
-
-            if not query_text:
-                logging.warning(f"No text content available for {query_path}")
-                return []
-
-            # Get ranking weights from config or use defaults
-            alpha = self.config.get("ranking", {}).get("alpha", 1.0)
-            beta = self.config.get("ranking", {}).get("beta", 0.0)
-            gamma = self.config.get("ranking", {}).get("gamma", 0.0)
-            
-            total = alpha + beta + gamma
-            alpha, beta, gamma = map(lambda x: x/total, [alpha, beta, gamma])
-            
-            logging.info(f"Using ranking weights: semantic={alpha:.2f}, recency={beta:.2f}, cooccurrence={gamma:.2f}")
+            item = self._item_by_path.get(query_path)
+            if item is not None:
+                # Indexed file: its stored embedding stands in for running the model
+                query_embedding = self._emb_matrix[item].copy()
+            else:
+                query_embedding = await self._query_embedding_for(query_path)
+                if query_embedding is None:
+                    return []
 
-            query_embedding = self.compute_embedding(query_text)
-            results = []
+            results = await self._rank(query_embedding, limit, query_path)
+        except Exception as e:
+            logging.error(f"Error getting recommendations: {e}", exc_info=True)
+            return []
 
-            with get_db() as conn:
-                conn.row_factory = sqlite3.Row  # Enable dictionary-like access
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT f.path, fc.embedding_vector 
-                    FROM files f 
-                    JOIN file_content fc ON f.id = fc.file_id
-                    WHERE f.path != ?
-                """, (str(query_path),))
-                
-                rows = cursor.fetchall()
-                for row in rows:
-                    embedding_vector = row['embedding_vector']
-                    if not embedding_vector:
-                        continue
-                        
-                    path = str(row['path'])
-                    stored_embedding = np.frombuffer(embedding_vector, dtype=np.float32)
-                    
-                    # Compute individual scores
-                    similarity = float(1 - np.linalg.norm(query_embedding - stored_embedding))
-                    recency = await self._get_recency_score(path)
-                    cooccurrence = await self._get_cooccurrence_score(query_path, path)
-                    
-                    # Compute final score
-                    final_score = (alpha * similarity + 
-                                 beta * recency + 
-                                 gamma * cooccurrence)
-                    
-                    results.append({
-                        "path": path,
-                        "final_score": round(final_score, 3),
-                        "factors": {
-                            "semantic_similarity": round(similarity, 3),
-                            "recency": round(recency, 3),
-                            "cooccurrence": round(cooccurrence, 3)
-                        },
-                        "weights": {
-                            "semantic": round(alpha, 2),
-                            "recency": round(beta, 2),
-                            "cooccurrence": round(gamma, 2)
-                        }
-                    })
-
-            # Sort by final score
-            results.sort(key=lambda x: x["final_score"], reverse=True)
-            logging.info(f"Found {len(results)} recommendations for {query_path}")
-            return results[:limit]
+        self._results[key] = (version, time.monotonic() + self.result_cache_ttl, results)
+        self._results.move_to_end(key)
+        if len(self._results) > self.result_cache_size:
+            self._results.popitem(last=False)
+        return list(results)
 
+    async def recommend_similar_by_vector(self, query_embedding: np.ndarray, limit: int = 5,
+                                          query_path: str = None) -> List[Dict]:
+        """Rank files against a unit-length query embedding; query_path (if given) is left out."""
+        try:
+            return await self._rank(np.asarray(query_embedding, dtype=np.float32), limit, query_path)
         except Exception as e:
             logging.error(f"Error getting recommendations: {e}", exc_info=True)
             return []
 
+    def invalidate_cache(self):
+        """Drop cached recommendations (files, embeddings or activity changed)."""
+        self._cache_version += 1
+        self._results.clear()
+        self._candidates.clear()
+
+    async def _query_embedding_for(self, query_path: str):
+        """Embed the text of a file that is not in the index; None without usable text."""
+        # try to extract text from file on disk first
+        query_text = extract_text_snippet(Path(query_path))
+        if not query_text:
+            # fallback: try to read stored preview from database
+            try:
+                with get_read_db() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        SELECT fc.content_preview
+                        FROM files f
+                        JOIN file_content fc ON f.id = fc.file_id
+                        WHERE f.path = ?
+                    """, (query_path,))
+                    row = cursor.fetchone()
+                    if row:
+                        preview = row['content_preview']
+                        if preview:
+                            query_text = preview
+                            logging.info(f"Using stored content_preview for {query_path}")
+            except Exception as e:
+                logging.warning(f"DB preview lookup failed for {query_path}: {e}")
+
+        if not query_text:
+            logging.warning(f"No text content available for {query_path}")
+            return None
+
+        # Unit length, so a dot product with the stored rows is the cosine
+        return await asyncio.to_thread(self._embed_query, query_text)
+
+    async def _rank(self, query_embedding: np.ndarray, limit: int, query_path: str = None) -> List[Dict]:
+        """Score indexed files against the query embedding and return the top `limit`."""
+        # Get ranking weights from config or use defaults
+        alpha = self.config.get("ranking", {}).get("alpha", 1.0)
+        beta = self.config.get("ranking", {}).get("beta", 0.0)
+        gamma = self.config.get("ranking", {}).get("gamma", 0.0)
+        
+        total = alpha + beta + gamma
+        alpha, beta, gamma = map(lambda x: x/total, [alpha, beta, gamma])
+        
+        logging.info(f"Using ranking weights: semantic={alpha:.2f}, recency={beta:.2f}, cooccurrence={gamma:.2f}")
+
+        n_items = len(self._emb_matrix)
+        if n_items == 0:
+            logging.warning("No embeddings indexed, cannot recommend")
+            return []
+
+        # Candidate set to rescore with recency and co-occurrence; cosine
+        # similarities come from the unit-length embedding matrix
+        # (+1 leaves room for the query file itself, which is skipped)
+        n_candidates = min(limit * self.CANDIDATE_FACTOR + 1, n_items)
+        items = self._candidates.get(query_embedding, tag=n_candidates)
+        if items is not None:
+            # Near-duplicate of a recent query: same candidates, exact scores.
+            # Not stored again under this query, or sets would chain from
+            # neighbour to neighbour past the similarity threshold
+            candidate_similarities = self._emb_matrix[items] @ query_embedding
+        elif n_items <= self.exact_search_max or self._rebuilding:
+            # One BLAS matrix-vector product over all stored embeddings
+            # (also while flush() swaps in a new Annoy index)
+            similarities = self._emb_matrix @ query_embedding
+            if n_candidates < n_items:
+                items = np.argpartition(-similarities, n_candidates - 1)[:n_candidates]
+            else:
+                items = np.arange(n_items)
+            candidate_similarities = similarities[items]
+            self._candidates.put(query_embedding, items, tag=n_candidates)
+        else:
+            # Approximate nearest neighbours from the Annoy index, plus rows
+            # stored since it was last built
+            items = set(self.index.get_nns_by_vector(query_embedding, n_candidates))
+            items = np.fromiter(items | self._pending_items, dtype=np.int64)
+            candidate_similarities = self._emb_matrix[items] @ query_embedding
+            self._candidates.put(query_embedding, items, tag=n_candidates)
+
+        candidate_paths = []
+        candidate_file_ids = []
+        keep = []
+        for position, item in enumerate(items.tolist()):
+            entry = self.file_id_map[item]
+            path = entry["path"]
+            if path == query_path:
+                continue
+            keep.append(position)
+            candidate_paths.append(path)
+            candidate_file_ids.append(entry["id"])
+        similarities = candidate_similarities[keep].astype(np.float64)
+
+        # Recency lies in [0, 1] and co-occurrence in [-1, 1], so similarity
+        # alone bounds each final score; candidates whose best case is below
+        # the limit-th best worst case cannot make the cut and skip the lookups
+        if 0 < limit < len(candidate_paths):
+            upper = alpha * similarities + max(beta, 0.0) + abs(gamma)
+            lower = alpha * similarities + min(beta, 0.0) - abs(gamma)
+            cutoff = -np.partition(-lower, limit - 1)[limit - 1]
+            viable = np.flatnonzero(upper >= cutoff)
+            if len(viable) < len(candidate_paths):
+                candidate_paths = [candidate_paths[i] for i in viable.tolist()]
+                candidate_file_ids = [candidate_file_ids[i] for i in viable.tolist()]
+                similarities = similarities[viable]
+        candidate_ids = dict(zip(candidate_file_ids, candidate_paths))
+
+        # Both lookups are blocking SQLite calls: run them side by side
+        # on worker threads instead of on the event loop
+        recency_scores, cooccurrence_scores = await asyncio.gather(
+            asyncio.to_thread(self._get_recency_scores_bulk, candidate_paths),
+            asyncio.to_thread(self._get_cooccurrence_scores_bulk, query_path, candidate_ids)
+        )
+
+        recency = np.array([recency_scores.get(path, 0.0) for path in candidate_paths])
+        cooccurrence = np.array([cooccurrence_scores.get(path, -1.0) for path in candidate_paths])
+
+        # Score every candidate at once, then only build results for the top ones
+        final_scores = alpha * similarities + beta * recency + gamma * cooccurrence
+        if 0 < limit < len(final_scores):
+            top = np.argpartition(-final_scores, limit - 1)[:limit]
+            top = top[np.argsort(-final_scores[top], kind="stable")]
+        else:
+            top = np.argsort(-final_scores, kind="stable")[:max(limit, 0)]
+
+        results = [{
+            "path": candidate_paths[i],
+            "final_score": round(float(final_scores[i]), 3),
+            "factors": {
+                "semantic_similarity": round(float(similarities[i]), 3),
+                "recency": round(float(recency[i]), 3),
+                "cooccurrence": round(float(cooccurrence[i]), 3)
+            },
+            "weights": {
+                "semantic": round(alpha, 2),
+                "recency": round(beta, 2),
+                "cooccurrence": round(gamma, 2)
+            }
+        } for i in top.tolist()]
+
+        logging.info(f"Found {len(candidate_paths)} recommendations for {query_path}")
+        return results
+
     def _get_similarity_reason(self, similarity: float) -> str:
         """Get human-readable similarity description."""
         if similarity > 0.8:
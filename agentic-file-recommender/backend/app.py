@@ -1,12 +1,13 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import yaml
+import json
 import logging
 from pathlib import Path
-from .db import init_db, is_db_initialized, get_db
-from .agents.file_agent import FileAgent
-from .agents.recommendation_agent import RecommendationAgent
-from .agents.activity_agent import ActivityAgent
+from .db import init_db, is_db_initialized, ensure_tables, get_read_db
+from .agentic.schemas import AgentRequest, AgentResponse
+from .schemas import ActivityLogResponse, HealthResponse, RecommendationsResponse, ScanResponse
+import asyncio
 import os
 
 # Configure logging
@@ -15,6 +16,58 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+# Keyset pages by rowid, so each chunk of /files is its own short query
+_LIST_FILES_SQL = "SELECT id, path FROM files WHERE id > ? ORDER BY id LIMIT ?"
+# Paths per page (and chunk) of the streamed /files response
+_LIST_FILES_CHUNK = 1000
+_FILE_BY_PATH_SQL = "SELECT path FROM files WHERE path = ?"
+_FILE_BY_PATH_NORM_SQL = "SELECT path FROM files WHERE path_norm = ? LIMIT 1"
+
+# libyaml's C parser when PyYAML was built with it
+try:
+    _YamlLoader = yaml.CSafeLoader
+except AttributeError:
+    _YamlLoader = yaml.SafeLoader
+
+def _load_config_file(path: Path):
+    """
+    Parse the YAML config, reusing a JSON copy of the parsed result (written
+    next to it) while the YAML file's mtime and size are unchanged.
+    """
+    cache_path = path.with_name(path.name + ".cache.json")
+    stat = path.stat()
+    stamp = [stat.st_mtime_ns, stat.st_size]
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("stamp") == stamp:
+            return cached["config"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+
+    with open(path) as f:
+        parsed = yaml.load(f, Loader=_YamlLoader)
+
+    try:
+        encoded = json.dumps({"stamp": stamp, "config": parsed})
+    except (TypeError, ValueError):
+        encoded = None
+    # Only cache configs that survive a JSON round trip unchanged (no int
+    # keys, dates, sets...); anything else is parsed every time
+    if encoded is None or json.loads(encoded)["config"] != parsed:
+        return parsed
+
+    tmp_path = cache_path.with_suffix(".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(encoded)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        # Read-only install: just parse every time
+        logging.warning(f"Could not cache parsed config at {cache_path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+    return parsed
+
 app = FastAPI(title="Agentic File Recommender")
 
 # Load config with proper error handling
@@ -23,8 +76,7 @@ try:
     if not config_path.exists():
         raise FileNotFoundError(f"Config file not found at {config_path}")
         
-    with open(config_path) as f:
-        config = yaml.safe_load(f)
+    config = _load_config_file(config_path)
         
     if not config:
         raise ValueError("Config file is empty")
@@ -38,6 +90,9 @@ except Exception as e:
     logging.error(f"Config loading error: {e}")
     raise RuntimeError(f"Failed to load config: {e}")
 
+# Lowercased once for the per-request suffix check
+ALLOWED_EXTS = frozenset(ext.lower() for ext in config.get("scan", {}).get("allowed_exts", []))
+
 # Initialize database if needed
 try:
     if not is_db_initialized():
@@ -46,6 +101,11 @@ try:
         logging.info("Database initialized successfully")
     else:
         logging.info("Database already initialized")
+        # Add columns and indexes introduced since the database was created
+        # before any agent reads them (init_db does this for a new one); a
+        # failure is only logged, so it never triggers the re-init below
+        if not ensure_tables():
+            logging.error("Failed to migrate the existing database schema")
 except RuntimeError as e:
     logging.error(f"Failed to initialize database: {e}")
     logging.info("Attempting to reinitialize database...")
@@ -58,27 +118,82 @@ except Exception as e:
     logging.error(f"Unexpected error during database initialization: {e}", exc_info=True)
     raise
 
-# Initialize agents
-recommendation_agent = RecommendationAgent(config)
-file_agent = FileAgent(config)
-file_agent.set_recommendation_agent(recommendation_agent)
-activity_agent = ActivityAgent(config)
+# Agents are built after startup on a worker thread (loading the embedding
+# model takes seconds), so the app answers /health right away; endpoints
+# that need them wait in _require_agents()
+recommendation_agent = None
+file_agent = None
+activity_agent = None
+tool_registry = None
+agent_brain = None
+planner_agent = None
+_agents_ready: asyncio.Event = None
+_agents_error: Exception = None
+_startup_task: asyncio.Task = None
 
-# Import agentic layer
-from .agentic import ToolRegistry, AgentBrain, PlannerAgent, AgentRequest, AgentResponse
+def _build_agents():
+    global recommendation_agent, file_agent, activity_agent, tool_registry, agent_brain, planner_agent
+    from .agents.recommendation_agent import RecommendationAgent
+    from .agents.file_agent import FileAgent
+    from .agents.activity_agent import ActivityAgent
+    from .agentic import ToolRegistry, AgentBrain, PlannerAgent
 
-# Initialize agentic components (after existing agent initialization)
-tool_registry = ToolRegistry(file_agent, recommendation_agent, activity_agent, config)
-agent_brain = AgentBrain(config)
-planner_agent = PlannerAgent(config, tool_registry, agent_brain)
+    # Initialize agents
+    recommendation_agent = RecommendationAgent(config)
+    file_agent = FileAgent(config)
+    file_agent.set_recommendation_agent(recommendation_agent)
+    activity_agent = ActivityAgent(config)
 
-@app.get("/health")
+    # Initialize agentic components (after existing agent initialization)
+    tool_registry = ToolRegistry(file_agent, recommendation_agent, activity_agent, config)
+    agent_brain = AgentBrain(config)
+    planner_agent = PlannerAgent(config, tool_registry, agent_brain)
+
+async def _start_agents():
+    global _agents_error
+    try:
+        await asyncio.to_thread(_build_agents)
+        # Access events are queued and written in batches from here on
+        activity_agent.start()
+        logging.info("Agents ready")
+    except Exception as e:
+        logging.error(f"Failed to start agents: {e}", exc_info=True)
+        _agents_error = e
+    finally:
+        _agents_ready.set()
+
+async def _require_agents():
+    """Wait until the agents are built; 503 if that failed."""
+    if not _agents_ready.is_set():
+        await _agents_ready.wait()
+    if _agents_error is not None:
+        raise HTTPException(503, f"Agents failed to start: {_agents_error}")
+
+@app.on_event("startup")
+async def start_background_tasks():
+    global _agents_ready, _startup_task
+    _agents_ready = asyncio.Event()
+    _startup_task = asyncio.create_task(_start_agents())
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    if _startup_task is not None:
+        await _startup_task
+    if activity_agent is not None:
+        await activity_agent.shutdown()
+
+@app.get("/health", response_model=HealthResponse)
 async def health_check():
-    return {"status": "ok", "config_loaded": bool(config)}
+    return {
+        "status": "ok",
+        "config_loaded": bool(config),
+        "agents_ready": _agents_ready is not None and _agents_ready.is_set() and _agents_error is None
+    }
 
 # @app.post("/scan")
-@app.get("/scan")
+@app.get("/scan", response_model=ScanResponse)
 async def scan_directory(path: str = None):
+    await _require_agents()
     try:
         root = path or config["scan"]["default_roots"][0]
         logging.info(f"Starting scan of directory: {root}")
@@ -88,20 +203,22 @@ async def scan_directory(path: str = None):
         logging.error(f"Scan error: {e}")
         raise HTTPException(500, str(e))
 
-@app.post("/activity/log")
+@app.post("/activity/log", response_model=ActivityLogResponse)
 async def log_activity(path: str):
     """Log file access event."""
     if not Path(path).exists():
         raise HTTPException(404, "File not found")
         
+    await _require_agents()
     success = await activity_agent.record_access(path)
     if not success:
         raise HTTPException(500, "Failed to log activity")
         
     return {"status": "logged", "path": path}
 
-@app.get("/recommend_from_file")
+@app.get("/recommend_from_file", response_model=RecommendationsResponse)
 async def recommend_from_file(path: str, limit: int = 5):
+    await _require_agents()
     try:
         # normalize and resolve path without strict existence check
         raw = path or ""
@@ -116,24 +233,19 @@ async def recommend_from_file(path: str, limit: int = 5):
             logging.info(f"File not found on disk: {abs_path}. Trying DB lookup.")
             db_path = None
             try:
-                with get_db() as conn:
+                with get_read_db() as conn:
                     cursor = conn.cursor()
                     # try exact match first
-                    cursor.execute("SELECT path FROM files WHERE path = ?", (str(abs_path),))
+                    cursor.execute(_FILE_BY_PATH_SQL, (str(abs_path),))
                     r = cursor.fetchone()
                     if r:
                         db_path = r[0]
                     else:
-                        # fallback: case-insensitive match using lower()
-                        cursor.execute("SELECT path FROM files")
-                        for row in cursor.fetchall():
-                            try:
-                                candidate = row[0]
-                                if candidate and os.path.normcase(candidate) == os.path.normcase(str(abs_path)):
-                                    db_path = candidate
-                                    break
-                            except Exception:
-                                continue
+                        # fallback: case-insensitive match on the indexed normcase'd path
+                        cursor.execute(_FILE_BY_PATH_NORM_SQL, (os.path.normcase(str(abs_path)),))
+                        r = cursor.fetchone()
+                        if r:
+                            db_path = r[0]
             except Exception as e:
                 logging.error(f"DB lookup error for path {abs_path}: {e}", exc_info=True)
 
@@ -147,8 +259,7 @@ async def recommend_from_file(path: str, limit: int = 5):
             raise HTTPException(status_code=400, detail="Path must be a file, not a directory")
 
         # optional extension check, but tolerate if not listed
-        allowed = config.get("scan", {}).get("allowed_exts", [])
-        if allowed and abs_path.suffix.lower() not in allowed:
+        if ALLOWED_EXTS and abs_path.suffix.lower() not in ALLOWED_EXTS:
             logging.warning(f"File type {abs_path.suffix} not in allowed_exts, continuing (may still recommend)")
             # do not raise; allow recommendation for non-listed types if DB contains content
 
@@ -167,18 +278,40 @@ async def recommend_from_file(path: str, limit: int = 5):
         logging.error(f"Recommendation error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _fetch_files_page(after_id: int) -> list:
+    """Next page of (id, path) rows; the pooled connection is back in the pool on return."""
+    with get_read_db() as conn:
+        return conn.execute(_LIST_FILES_SQL, (after_id, _LIST_FILES_CHUNK)).fetchall()
+
+def _iter_files_json(rows: list):
+    """Yield {"files": [...]} page by page, starting from an already fetched first page."""
+    yield '{"files":['
+    separator = ""
+    try:
+        while rows:
+            yield separator + ",".join(json.dumps(row[1]) for row in rows)
+            separator = ","
+            if len(rows) < _LIST_FILES_CHUNK:
+                break
+            rows = _fetch_files_page(rows[-1][0])
+    except Exception as e:
+        # Headers are already sent; the truncated body tells the client
+        logging.error(f"Error listing files: {e}")
+        return
+    yield "]}"
+
 @app.get("/files")
 async def list_files():
     """List all scanned files in the system."""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT path FROM files")
-            files = [row[0] for row in cursor.fetchall()]
-            return {"files": files}
+        # First page before responding, so a database error is still a 500
+        first_page = await asyncio.to_thread(_fetch_files_page, 0)
     except Exception as e:
         logging.error(f"Error listing files: {e}")
         raise HTTPException(500, str(e))
+    # The rest is fetched on the threadpool as the client reads; no
+    # connection is held between chunks
+    return StreamingResponse(_iter_files_json(first_page), media_type="application/json")
 
 @app.post("/agent_query", response_model=AgentResponse)
 async def agent_query(request: AgentRequest):
@@ -193,6 +326,7 @@ async def agent_query(request: AgentRequest):
         "max_planning_steps": 3
     }
     """
+    await _require_agents()
     try:
         logging.info(f"Agent query received: {request.query}")
         result = await planner_agent.execute(request)
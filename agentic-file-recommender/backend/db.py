@@ -1,35 +1,216 @@
+import asyncio
 import sqlite3
 import pathlib
 import logging
+import atexit
+import os
+import queue
+import threading
 from datetime import datetime
 from contextlib import contextmanager
 from typing import Generator
 
 DB_PATH = pathlib.Path(__file__).parent.parent / "data" / "files.db"
 
-@contextmanager
-def get_db() -> Generator[sqlite3.Connection, None, None]:
-    """Thread-safe database connection manager with WAL mode."""
+# Prepared statements kept per connection; connections are long-lived, so
+# every query this app issues can stay compiled (sqlite3's default is 128)
+_CACHED_STATEMENTS = 256
+
+# Per-connection settings applied on every open (they only last for the
+# connection): ~20 MB page cache, 256 MB memory-mapped reads, 30 second busy timeout
+_SESSION_PRAGMAS = """
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-20000;
+    PRAGMA mmap_size=268435456;
+    PRAGMA busy_timeout=30000;
+"""
+# Writable connections also put the file in WAL mode first (this persists in
+# the database file). NORMAL sync is still crash-safe under WAL (only the last
+# commits may be lost on power failure).
+_CONNECTION_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA foreign_keys=ON;
+""" + _SESSION_PRAGMAS
+
+def connect(read_only: bool = False, isolation_level: str = None) -> sqlite3.Connection:
+    """
+    Open a connection with WAL, a busy timeout and tuned pragmas.
+    Autocommit unless an isolation_level is given; read_only opens with mode=ro.
+    """
+    if read_only:
+        target, uri = DB_PATH.resolve().as_uri() + "?mode=ro", True
+    else:
+        target, uri = DB_PATH, False
     conn = sqlite3.connect(
-        DB_PATH, 
+        target,
         timeout=60,
         check_same_thread=False,
-        isolation_level=None  # Enable autocommit mode
+        isolation_level=isolation_level,
+        uri=uri,
+        cached_statements=_CACHED_STATEMENTS
     )
+    conn.row_factory = sqlite3.Row  # Rows support both index and name access
     try:
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA busy_timeout=30000")  # 30 second busy timeout
-        yield conn
-    finally:
-        conn.commit()
+        conn.executescript(_SESSION_PRAGMAS if read_only else _CONNECTION_PRAGMAS)
+    except Exception:
         conn.close()
+        raise
+    return conn
+
+# Connections are long-lived so requests skip connect + pragmas; every one
+# opened below is tracked so close_db() can close it
+_open_connections = set()
+_connections_lock = threading.Lock()
+# Bumped by close_db(); holders of an older connection reopen
+_generation = 0
+
+def _open(**kwargs) -> sqlite3.Connection:
+    conn = connect(**kwargs)
+    with _connections_lock:
+        _open_connections.add(conn)
+    return conn
+
+def _discard(conn: sqlite3.Connection):
+    with _connections_lock:
+        _open_connections.discard(conn)
+    conn.close()
+
+def _current_key():
+    """Identifies the database a cached connection must belong to."""
+    return (DB_PATH, _generation)
+
+def close_db():
+    """Close every cached connection (before the database file is removed, and at exit)."""
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        connections = list(_open_connections)
+        _open_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except Exception as e:
+            logging.warning(f"Error closing database connection: {e}")
+
+atexit.register(close_db)
+
+# Read-only connections, at most one per core in use at a time; under WAL
+# they never wait on the writer
+_READ_POOL_SIZE = os.cpu_count() or 1
+_read_pool: queue.LifoQueue = queue.LifoQueue()
+_read_slots = threading.BoundedSemaphore(_READ_POOL_SIZE)
+
+def _on_event_loop() -> bool:
+    """Whether this thread is running an asyncio event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+@contextmanager
+def get_read_db() -> Generator[sqlite3.Connection, None, None]:
+    """
+    Yield a pooled read-only connection, returned to the pool afterwards.
+    Worker threads wait for a free slot (so don't nest these there: with
+    every slot taken, the inner call waits forever); the event loop thread
+    never blocks and gets a short-lived connection of its own instead.
+    """
+    if not _read_slots.acquire(blocking=not _on_event_loop()):
+        conn = connect(read_only=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+    try:
+        key = _current_key()
+        conn = None
+        while conn is None:
+            try:
+                pooled_key, pooled = _read_pool.get_nowait()
+            except queue.Empty:
+                conn = _open(read_only=True)
+                break
+            if pooled_key == key:
+                conn = pooled
+            else:
+                _discard(pooled)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if key == _current_key():
+                _read_pool.put((key, conn))
+            else:
+                _discard(conn)
+    finally:
+        _read_slots.release()
+
+# The single write connection; writers take turns on it
+_write_lock = threading.RLock()
+_writer = None
+
+@contextmanager
+def get_write_db() -> Generator[sqlite3.Connection, None, None]:
+    """
+    Yield the shared write connection, one writer at a time.
+    Statements that modify data start a BEGIN IMMEDIATE transaction, which is
+    committed when the block exits (rolled back on error).
+    """
+    global _writer
+    with _write_lock:
+        key = _current_key()
+        if _writer is None or _writer[0] != key:
+            if _writer is not None:
+                _discard(_writer[1])
+            _writer = (key, _open(isolation_level="IMMEDIATE"))
+        conn = _writer[1]
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        else:
+            if conn.in_transaction:
+                conn.commit()
+
+@contextmanager
+def get_write_tx() -> Generator[sqlite3.Connection, None, None]:
+    """
+    Like get_write_db(), but BEGIN IMMEDIATE is issued up front, so reads and
+    schema changes before the first data write are part of the transaction
+    too and the write lock is never upgraded mid-transaction. Don't use
+    executescript() inside: it commits first.
+    """
+    with get_write_db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+def _execute_statements(cursor: sqlite3.Cursor, script: str):
+    """Run a multi-statement script one statement at a time, in the open transaction."""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            cursor.execute(statement)
+            statement = ""
 
 def is_db_initialized() -> bool:
     """Check if database exists and has required tables."""
     if not DB_PATH.exists():
         return False
     try:
-        with get_db() as conn:
+        with get_read_db() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT name FROM sqlite_master 
@@ -40,12 +221,20 @@ def is_db_initialized() -> bool:
     except Exception:
         return False
 
+def _ensure_column(cursor: sqlite3.Cursor, table: str, column: str, decl: str):
+    """Add a column to an existing table if it is missing (lightweight migration)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        logging.info(f"Added column {table}.{column}")
+
 def ensure_tables():
     """Ensure all required tables exist."""
     try:
-        with get_db() as conn:
+        # Schema, migrations and backfill apply together or not at all
+        with get_write_tx() as conn:
             cursor = conn.cursor()
-            cursor.executescript("""
+            _execute_statements(cursor, """
                 -- Activity tracking tables
                 CREATE TABLE IF NOT EXISTS file_activity (
                     file_id INTEGER PRIMARY KEY,
@@ -63,9 +252,44 @@ def ensure_tables():
                     FOREIGN KEY(file_id_2) REFERENCES files(id)
                 );
 
-                CREATE INDEX IF NOT EXISTS idx_file_activity_access ON file_activity(last_accessed);
+                -- Covering indexes: file_id is the rowid, so every index entry
+                -- already carries it. Recency order and the co-occurrence
+                -- window scan read (last_accessed, access_count, file_id) ...
+                CREATE INDEX IF NOT EXISTS idx_activity_covering ON file_activity(last_accessed, access_count);
+                -- ... and "most accessed" reads (access_count, last_accessed, file_id)
+                CREATE INDEX IF NOT EXISTS idx_activity_count_covering ON file_activity(access_count, last_accessed);
+                -- Prefixes of the two above
+                DROP INDEX IF EXISTS idx_file_activity_access;
+                DROP INDEX IF EXISTS idx_file_activity_recent;
+                DROP INDEX IF EXISTS idx_file_activity_count;
                 CREATE INDEX IF NOT EXISTS idx_cooccurrence_counts ON file_cooccurrence(co_count);
+                -- Pairs are stored as (min id, max id); the primary key serves
+                -- lookups by file_id_1, this one serves lookups by file_id_2
+                CREATE INDEX IF NOT EXISTS idx_cooccurrence_reverse ON file_cooccurrence(file_id_2, file_id_1);
+
+                -- Serves "ORDER BY last_scanned DESC LIMIT n" (get_files tool)
+                CREATE INDEX IF NOT EXISTS idx_files_last_scanned ON files(last_scanned);
             """)
+
+            # Columns added after the initial schema
+            _ensure_column(cursor, "files", "size", "INTEGER")
+            _ensure_column(cursor, "files", "path_norm", "TEXT")
+            _ensure_column(cursor, "files", "mtime_ns", "INTEGER")
+            _ensure_column(cursor, "file_content", "emb_scale", "REAL")
+
+            # os.path.normcase(path), for case-insensitive lookups by index;
+            # backfill rows scanned before the column existed
+            cursor.execute("SELECT id, path FROM files WHERE path_norm IS NULL")
+            missing = [(os.path.normcase(path), file_id) for file_id, path in cursor.fetchall()]
+            if missing:
+                cursor.executemany("UPDATE files SET path_norm = ? WHERE id = ?", missing)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_path_norm ON files(path_norm)")
+
+            # Refresh planner statistics so the indexes above get picked;
+            # analysis_limit samples each index, bounding the cost on big tables
+            cursor.execute("PRAGMA analysis_limit=400")
+            cursor.execute("ANALYZE")
+
             logging.info("Activity tables verified")
             return True
     except Exception as e:
@@ -79,18 +303,18 @@ def init_db(force: bool = False):
         
         if force and DB_PATH.exists():
             try:
+                # Cached connections would keep the old file open
+                close_db()
                 DB_PATH.unlink()
                 logging.info("Deleted existing database")
             except Exception as e:
                 logging.error(f"Failed to delete existing database: {e}")
         
-        with get_db() as conn:
+        with get_write_tx() as conn:
             cursor = conn.cursor()
             
-            # Core tables
-            cursor.executescript("""
-            PRAGMA foreign_keys = ON;
-            
+            # Core tables (foreign_keys is already on for every connection)
+            _execute_statements(cursor, """
             CREATE TABLE IF NOT EXISTS files (
                 id INTEGER PRIMARY KEY,
                 path TEXT UNIQUE NOT NULL,
@@ -98,6 +322,9 @@ def init_db(force: bool = False):
                 file_type TEXT NOT NULL,
                 last_modified DATETIME NOT NULL,
                 last_scanned DATETIME NOT NULL,
+                size INTEGER,
+                path_norm TEXT,
+                mtime_ns INTEGER,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP
             );
             
@@ -105,6 +332,7 @@ def init_db(force: bool = False):
                 file_id INTEGER PRIMARY KEY,
                 content_preview TEXT,
                 embedding_vector BLOB,
+                emb_scale REAL,
                 FOREIGN KEY(file_id) REFERENCES files(id) ON DELETE CASCADE
             );
             
@@ -0,0 +1,41 @@
+from pydantic import BaseModel
+from typing import List
+
+class HealthResponse(BaseModel):
+    """Service and agent startup status."""
+    status: str
+    config_loaded: bool
+    agents_ready: bool
+
+class ScanResponse(BaseModel):
+    """Outcome of a directory scan."""
+    status: str
+    message: str
+
+class ActivityLogResponse(BaseModel):
+    """Acknowledges a logged file access."""
+    status: str
+    path: str
+
+class ScoreFactors(BaseModel):
+    """Per-factor scores behind a recommendation."""
+    semantic_similarity: float
+    recency: float
+    cooccurrence: float
+
+class ScoreWeights(BaseModel):
+    """Weights the factors were combined with."""
+    semantic: float
+    recency: float
+    cooccurrence: float
+
+class Recommendation(BaseModel):
+    """A recommended file with its score breakdown."""
+    path: str
+    final_score: float
+    factors: ScoreFactors
+    weights: ScoreWeights
+
+class RecommendationsResponse(BaseModel):
+    """Files similar to the requested one, best first."""
+    recommendations: List[Recommendation]
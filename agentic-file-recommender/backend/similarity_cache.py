@@ -0,0 +1,56 @@
+import numpy as np
+from typing import Any, Hashable, Optional
+
+class SimilarityCache:
+    """
+    Fixed-size LRU cache keyed by unit-length vectors. A lookup hits the most
+    similar stored key whose cosine similarity reaches `threshold` (and whose
+    tag matches), so near-duplicate queries share one entry.
+    """
+
+    def __init__(self, dim: int, capacity: int = 256, threshold: float = 0.92):
+        self.threshold = threshold
+        # Row i is the key of slot i; slots fill in order and are reused LRU
+        self._keys = np.zeros((capacity, dim), dtype=np.float32)
+        self._values = [None] * capacity
+        self._tags = [None] * capacity
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._size = 0
+        self._clock = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _touch(self, slot: int):
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def get(self, vector: np.ndarray, tag: Hashable = None) -> Optional[Any]:
+        """Value of the closest stored key within the threshold, or None."""
+        if not self._size:
+            return None
+        # One matrix-vector product against every cached key
+        similarities = self._keys[:self._size] @ vector
+        close = np.flatnonzero(similarities >= self.threshold)
+        for slot in close[np.argsort(-similarities[close])].tolist():
+            if self._tags[slot] == tag:
+                self._touch(slot)
+                return self._values[slot]
+        return None
+
+    def put(self, vector: np.ndarray, value: Any, tag: Hashable = None):
+        """Store value under vector, evicting the least recently used entry when full."""
+        if self._size < len(self._values):
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._last_used))
+        self._keys[slot] = vector
+        self._values[slot] = value
+        self._tags[slot] = tag
+        self._touch(slot)
+
+    def clear(self):
+        self._values = [None] * len(self._values)
+        self._tags = [None] * len(self._tags)
+        self._size = 0
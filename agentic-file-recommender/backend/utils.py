@@ -1,8 +1,11 @@
+import codecs
 import hashlib
 import pathlib
 import logging
-from typing import List, Optional
+import os
+from typing import List, Optional, Tuple
 import mimetypes
+import re
 
 # Try to import chardet, use fallback if not available
 try:
@@ -12,24 +15,63 @@ except ImportError:
     HAS_CHARDET = False
     logging.warning("chardet not found, using UTF-8 as default encoding")
 
+# Byte-order marks, checked before any decoding
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+# Runs of whitespace, collapsed to one space in snippets (Unicode-aware, like str.split)
+_WS_RE = re.compile(r'\s+')
+# Suffix -> MIME type and the text suffixes we extract snippets from, taken
+# once from the mimetypes tables so per-file checks are plain dict/set lookups
+mimetypes.init()
+_EXT_TO_MIME = {ext.lower(): mime for ext, mime in mimetypes.types_map.items()}
+_TEXT_MIME_PREFIXES = ('text/', 'application/json', 'application/xml', 'application/javascript')
+_TEXT_EXTS = frozenset(ext for ext, mime in _EXT_TO_MIME.items() if mime.startswith(_TEXT_MIME_PREFIXES))
+# chardet is pure Python; a 2 KiB prefix is plenty to guess from
+_CHARDET_SAMPLE = 2048
+
 def detect_encoding(raw_data: bytes) -> str:
     """Detect text encoding with fallback to UTF-8."""
+    for bom, encoding in _BOMS:
+        if raw_data.startswith(bom):
+            return encoding
+    try:
+        # Incremental decode tolerates a multi-byte character cut off at the end of the snippet
+        codecs.getincrementaldecoder('utf-8')().decode(raw_data)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
     if HAS_CHARDET:
         try:
-            detected = chardet.detect(raw_data)
+            detected = chardet.detect(raw_data[:_CHARDET_SAMPLE])
             return detected['encoding'] or 'utf-8'
         except Exception as e:
             logging.warning(f"chardet detection failed: {e}")
     return 'utf-8'
 
+_HASH_CHUNK_SIZE = 1 << 20
+
+def file_fingerprint(path: pathlib.Path, stat: Optional[os.stat_result] = None) -> Tuple[int, int]:
+    """(size, mtime in ns) of a file; a matching stored fingerprint means it is unchanged and need not be rehashed."""
+    stat = stat or os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
 def compute_file_hash(path: pathlib.Path) -> str:
     """Compute SHA-256 hash of file with proper error handling."""
     try:
-        sha256 = hashlib.sha256()
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+        # Plain reads, not mmap: a file truncated by another process while
+        # mapped raises SIGBUS and kills the server, a short read does not
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(hashlib, "file_digest"):
+                # Python 3.11+: read+hash loop runs in C (OpenSSL, SHA-NI where available)
+                return hashlib.file_digest(f, "sha256").hexdigest()
+            # Older Pythons: 1 MiB reads keep Python-level calls per file low
+            sha256 = hashlib.sha256()
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
                 sha256.update(chunk)
-        return sha256.hexdigest()
+            return sha256.hexdigest()
     except Exception as e:
         logging.error(f"Failed to hash file {path}: {e}")
         return ""
@@ -37,31 +79,26 @@ def compute_file_hash(path: pathlib.Path) -> str:
 def extract_text_snippet(path: pathlib.Path, max_bytes: int = 8192) -> Optional[str]:
     """Extract text snippet with improved type handling."""
     try:
+        # Handle common text file types (decided by suffix, before touching the file)
+        suffix = path.suffix.lower()
+        if suffix not in _TEXT_EXTS:
+            logging.warning(f"Unsupported file type {_EXT_TO_MIME.get(suffix)} for {path}")
+            return None
+            
         # Check if file exists and is readable
         if not path.exists():
             logging.error(f"File not found: {path}")
             return None
             
-        # Get file type
-        mime_type, _ = mimetypes.guess_type(str(path))
-        
-        # Handle common text file types
-        text_types = ['text/', 'application/json', 'application/xml', 'application/javascript']
-        is_text = any(mime_type and mime_type.startswith(prefix) for prefix in text_types)
-        
-        if not is_text:
-            logging.warning(f"Unsupported file type {mime_type} for {path}")
-            return None
-            
         # Read and decode file
         with open(path, 'rb') as f:
             raw_data = f.read(max_bytes)
             
         encoding = detect_encoding(raw_data)
         text = raw_data.decode(encoding, errors='ignore')
-        cleaned_text = ' '.join(text.split())  # Normalize whitespace
+        cleaned_text = _WS_RE.sub(' ', text).strip()  # Normalize whitespace
         
-        if not cleaned_text.strip():
+        if not cleaned_text:
             logging.warning(f"No text content extracted from {path}")
             return None
             
@@ -73,5 +110,4 @@ def extract_text_snippet(path: pathlib.Path, max_bytes: int = 8192) -> Optional[
 
 def get_file_type(path: pathlib.Path) -> str:
     """Get standardized file type."""
-    mime_type, _ = mimetypes.guess_type(str(path))
-    return mime_type or 'application/octet-stream'
+    return _EXT_TO_MIME.get(path.suffix.lower(), 'application/octet-stream')